@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from Ecom.warmup import preload_enabled, warmup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Ecom.settings')
 
 application = get_asgi_application()
+
+if preload_enabled():
+    warmup()
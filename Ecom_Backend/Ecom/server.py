@@ -0,0 +1,165 @@
+"""
+Gunicorn server profiles for the Ecom project.
+
+gunicorn.conf.py (next to manage.py, picked up automatically by `gunicorn`)
+loads the profile named by GUNICORN_PROFILE:
+
+  catalog   read-heavy browsing/search: gthread workers, a few threads each
+  checkout  write-heavy ordering/registration: sync workers, longer timeout
+            (no long-polls or event streams on the change feed there)
+  async     uvicorn workers on Ecom.asgi (needs uvicorn installed)
+
+Any value can be overridden from the environment:
+  WEB_CONCURRENCY               worker processes (default derived from CPU count)
+  GUNICORN_THREADS              threads per gthread worker
+  GUNICORN_WORKER_CLASS         sync | gthread | uvicorn
+  GUNICORN_MAX_REQUESTS         recycle a worker after this many requests (0 = never)
+  GUNICORN_MAX_REQUESTS_JITTER  random spread so workers do not all recycle at once
+  GUNICORN_KEEPALIVE            seconds to hold idle keep-alive connections
+  GUNICORN_TIMEOUT              seconds before a silent worker is killed
+  GUNICORN_PRELOAD              True/False, load the app (and Ecom.warmup) in the master
+  GUNICORN_MAX_WORKER_MEMORY_MB restart a worker gracefully once its RSS exceeds this
+  GUNICORN_BIND                 address to listen on
+"""
+import logging
+import os
+
+logger = logging.getLogger("gunicorn.error")
+
+UVICORN_WORKER_CLASSES = ("uvicorn_worker.UvicornWorker", "uvicorn.workers.UvicornWorker")
+
+PROFILES = {
+    "catalog": {
+        "worker_class": "gthread",
+        "workers_per_core": 2,
+        "threads": 4,
+        "max_requests": 5000,
+        "max_requests_jitter": 500,
+        "keepalive": 5,
+        "timeout": 30,
+        "preload_app": True,
+        "max_worker_memory_mb": 512,
+    },
+    "checkout": {
+        "worker_class": "sync",
+        "workers_per_core": 2,
+        "threads": 1,
+        "max_requests": 2000,
+        "max_requests_jitter": 200,
+        "keepalive": 2,
+        "timeout": 60,
+        "preload_app": True,
+        "max_worker_memory_mb": 512,
+    },
+    "async": {
+        "worker_class": "uvicorn",
+        "workers_per_core": 1,
+        "threads": 1,
+        "max_requests": 10000,
+        "max_requests_jitter": 1000,
+        "keepalive": 5,
+        "timeout": 30,
+        "preload_app": True,
+        "max_worker_memory_mb": 512,
+    },
+}
+DEFAULT_PROFILE = "catalog"
+
+
+def cpu_count():
+    # honour CPU affinity / container limits where the platform exposes them
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def uvicorn_worker_class():
+    import importlib
+
+    for path in UVICORN_WORKER_CLASSES:
+        module, _name = path.rsplit(".", 1)
+        try:
+            importlib.import_module(module)
+            return path
+        except ImportError:
+            continue
+    return None
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return value == "True"
+    return cast(value)
+
+
+def unavailable_reason(profile):
+    """Why a profile cannot run as specified here (None if it can)."""
+    worker_class = _env("GUNICORN_WORKER_CLASS", PROFILES[profile]["worker_class"])
+    if worker_class == "uvicorn" and uvicorn_worker_class() is None:
+        return "uvicorn is not installed (it would run as gthread)"
+    return None
+
+
+def build_config(profile=None):
+    """Return the gunicorn settings (as config-file globals) for a profile plus env overrides."""
+    name = profile or os.environ.get("GUNICORN_PROFILE", DEFAULT_PROFILE)
+    if name not in PROFILES:
+        raise ValueError(f"unknown GUNICORN_PROFILE {name!r}; choose from {', '.join(PROFILES)}")
+    p = PROFILES[name]
+
+    worker_class = _env("GUNICORN_WORKER_CLASS", p["worker_class"])
+    wsgi_app = "Ecom.wsgi:application"
+    if worker_class == "uvicorn":
+        worker_class = uvicorn_worker_class()
+        if worker_class is None:
+            logger.warning("uvicorn is not installed; profile %r falls back to gthread workers", name)
+            worker_class = "gthread"
+        else:
+            wsgi_app = "Ecom.asgi:application"
+
+    workers = _env("WEB_CONCURRENCY", p["workers_per_core"] * cpu_count() + 1, int)
+    threads = _env("GUNICORN_THREADS", p["threads"], int) if worker_class == "gthread" else 1
+
+    return {
+        "profile": name,
+        "wsgi_app": wsgi_app,
+        "bind": _env("GUNICORN_BIND", "0.0.0.0:8000"),
+        "worker_class": worker_class,
+        "workers": workers,
+        "threads": threads,
+        "max_requests": _env("GUNICORN_MAX_REQUESTS", p["max_requests"], int),
+        "max_requests_jitter": _env("GUNICORN_MAX_REQUESTS_JITTER", p["max_requests_jitter"], int),
+        "keepalive": _env("GUNICORN_KEEPALIVE", p["keepalive"], int),
+        "timeout": _env("GUNICORN_TIMEOUT", p["timeout"], int),
+        "graceful_timeout": 30,
+        "preload_app": _env("GUNICORN_PRELOAD", p["preload_app"], bool),
+        "max_worker_memory_mb": _env("GUNICORN_MAX_WORKER_MEMORY_MB", p["max_worker_memory_mb"], int),
+    }
+
+
+def current_rss_mb():
+    """Resident set size of this process in MiB (Linux /proc; 0 where unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def make_post_request_hook(limit_mb):
+    """
+    gunicorn has no per-worker memory limit; this post_request hook asks a
+    worker to exit gracefully (the master replaces it) once it grows past
+    limit_mb. The in-flight request always completes.
+    """
+    def post_request(worker, req, environ, resp):
+        if limit_mb and current_rss_mb() > limit_mb:
+            logger.warning("worker %s exceeded %s MiB RSS; restarting it", worker.pid, limit_mb)
+            worker.alive = False
+
+    return post_request
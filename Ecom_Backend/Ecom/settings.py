@@ -11,15 +11,16 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-from pathlib import Path
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Load environment variables from .env file
-load_dotenv(BASE_DIR / ".env")
+# Load environment variables from .env file (python-dotenv is only imported when there is one)
+if (BASE_DIR / ".env").exists():
+    from dotenv import load_dotenv
+
+    load_dotenv(BASE_DIR / ".env")
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -49,8 +50,10 @@ INSTALLED_APPS = [
     "shop",
 ]
 
-MIDDLEWARE = [    
+MIDDLEWARE = [
+    "shop.instrumentation.PerformanceMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "shop.compression.CompressionMiddleware",
     'django.middleware.security.SecurityMiddleware',    
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -87,9 +90,21 @@ WSGI_APPLICATION = 'Ecom.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get("DATABASE_NAME", BASE_DIR / 'db.sqlite3'),
     }
 }
+# Local memory by default (per process). Point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache, e.g. django.core.cache.backends.redis.RedisCache, to share it across workers.
+# With locmem and more than one worker, catalog changes only invalidate the cached pages
+# of the worker that made them; the others serve stale pages for up to
+# SHOP_CATALOG_CACHE_TIMEOUT (`manage.py check --deploy` warns, shop.W001).
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
 CORS_ALLOW_CREDENTIALS = True
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
@@ -99,6 +114,16 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ),
+    # orjson-backed when orjson is installed, DRF's stdlib JSON otherwise (same output)
+    "DEFAULT_RENDERER_CLASSES": (
+        "shop.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "shop.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 12,
     "DEFAULT_FILTER_BACKENDS": (
@@ -175,6 +200,58 @@ EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "suganyasdv16@gmail.com")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "") 
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 
+# Per-request performance instrumentation (shop.instrumentation.PerformanceMiddleware).
+# Samples 1% of requests by default; Server-Timing goes to staff only unless set to True/False.
+_server_timing = os.environ.get("SHOP_PERF_SERVER_TIMING", "staff")
+SHOP_PERF = {
+    "SAMPLE_RATE": float(os.environ.get("SHOP_PERF_SAMPLE_RATE", 0.01)),
+    "SERVER_TIMING": _server_timing if _server_timing == "staff" else _server_timing == "True",
+    "SLOW_QUERY_MS": float(os.environ.get("SHOP_PERF_SLOW_QUERY_MS", 100)),
+    "DUPLICATE_QUERY_THRESHOLD": int(os.environ.get("SHOP_PERF_DUPLICATE_QUERY_THRESHOLD", 5)),
+}
+
+# API response compression and precompressed catalog pages (shop.compression.CompressionMiddleware)
+SHOP_COMPRESSION = {
+    "MIN_SIZE": int(os.environ.get("SHOP_COMPRESSION_MIN_SIZE", 512)),
+    "CACHE_TIMEOUT": int(os.environ.get("SHOP_CATALOG_CACHE_TIMEOUT", 300)),
+}
+
+# Idempotency-Key handling on order creation (shop.idempotency)
+SHOP_IDEMPOTENCY = {
+    "TTL": int(os.environ.get("SHOP_IDEMPOTENCY_TTL", 24 * 60 * 60)),
+    # an unfinished request's claim is taken over after this many seconds (> worker timeout)
+    "LOCK_TIMEOUT": int(os.environ.get("SHOP_IDEMPOTENCY_LOCK_TIMEOUT", 90)),
+}
+
+# catalog change feed (shop.changes): long-poll and Server-Sent Events limits. Keep both
+# well below the smallest worker timeout (GUNICORN_TIMEOUT, 30 s in the shipped profiles);
+# gunicorn.conf.py sets SHOP_CHANGES_STREAMING=False for sync workers.
+SHOP_CHANGES = {
+    "MAX_WAIT": int(os.environ.get("SHOP_CHANGES_MAX_WAIT", 20)),
+    "STREAM_DURATION": int(os.environ.get("SHOP_CHANGES_STREAM_DURATION", 20)),
+    "STREAMING": os.environ.get("SHOP_CHANGES_STREAMING", "True") == "True",
+    # seconds changes after a missing seq are held back (seq is insert order, not commit
+    # order); unset: 0 on SQLite, 30 s on databases with concurrent writers
+    "GAP_TIMEOUT": float(os.environ["SHOP_CHANGES_GAP_TIMEOUT"])
+    if os.environ.get("SHOP_CHANGES_GAP_TIMEOUT") else None,
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # INFO logs one JSON line per sampled request; WARNING keeps only slow and N+1 queries
+        "shop.perf": {
+            "handlers": ["console"],
+            "level": os.environ.get("SHOP_PERF_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
+
 
 
 
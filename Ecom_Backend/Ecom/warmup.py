@@ -0,0 +1,50 @@
+"""
+Process warmup for preloaded (gunicorn --preload / preload_app) deployments.
+
+Without preloading, each worker imports Ecom.wsgi itself and only loads the
+URLconf, DRF views/serializers, Pillow and the mail backend when a request
+first needs them. With preloading, the master calls warmup() once before
+forking so every worker inherits those modules and objects copy-on-write:
+workers start almost instantly and share the pages instead of holding
+their own copies.
+
+Enabled by setting DJANGO_PRELOAD=True (read by Ecom/wsgi.py and Ecom/asgi.py).
+"""
+import gc
+import os
+
+
+def preload_enabled():
+    return os.environ.get("DJANGO_PRELOAD", "False") == "True"
+
+
+def warmup():
+    from django.db import DatabaseError, connections
+    from django.urls import get_resolver
+
+    # import the URLconf and with it every view, serializer and filter backend
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver._populate()
+
+    # imported lazily by ImageField / the SMTP backend on first upload or email
+    import PIL.Image  # noqa: F401
+    from django.core.mail import get_connection
+
+    get_connection()
+
+    # in-memory index that would otherwise be built by each worker
+    from shop.autocomplete import index
+
+    try:
+        index.ensure_loaded()
+    except DatabaseError:
+        pass  # e.g. not migrated yet; built lazily instead
+
+    # a connection opened in the master must never be shared with forked workers
+    connections.close_all()
+
+    # move everything allocated so far into the permanent generation so the
+    # cyclic GC in the workers never writes to (and so never copies) these pages
+    gc.collect()
+    gc.freeze()
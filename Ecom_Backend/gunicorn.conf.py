@@ -0,0 +1,53 @@
+# Gunicorn configuration, loaded automatically when gunicorn runs from this
+# directory. Pick a workload profile with GUNICORN_PROFILE (catalog, checkout,
+# async) and override single settings through the env vars listed in Ecom/server.py.
+#
+#   GUNICORN_PROFILE=checkout gunicorn
+import os
+
+from Ecom.server import build_config, make_post_request_hook
+
+_config = build_config()
+
+wsgi_app = _config["wsgi_app"]
+bind = _config["bind"]
+worker_class = _config["worker_class"]
+workers = _config["workers"]
+threads = _config["threads"]
+max_requests = _config["max_requests"]
+max_requests_jitter = _config["max_requests_jitter"]
+keepalive = _config["keepalive"]
+timeout = _config["timeout"]
+graceful_timeout = _config["graceful_timeout"]
+preload_app = _config["preload_app"]
+
+if preload_app:
+    # Ecom.wsgi / Ecom.asgi run Ecom.warmup in the master before workers fork
+    os.environ.setdefault("DJANGO_PRELOAD", "True")
+
+if worker_class == "sync":
+    # a long-poll or event stream would hold the whole (single-request) worker
+    os.environ.setdefault("SHOP_CHANGES_STREAMING", "False")
+
+post_request = make_post_request_hook(_config["max_worker_memory_mb"])
+
+
+def post_worker_init(worker):
+    # build the autocomplete index before the first request (a no-op check
+    # when the preloaded master already built it)
+    from django.db import DatabaseError, connections
+    from shop.autocomplete import index
+
+    try:
+        index.ensure_loaded()
+    except DatabaseError as exc:
+        worker.log.warning("autocomplete index not built at start: %s", exc)
+    finally:
+        connections.close_all()
+
+
+def when_ready(server):
+    server.log.info(
+        "profile %s: %s x %s worker(s), %s thread(s), preload=%s",
+        _config["profile"], workers, worker_class, threads, preload_app,
+    )
@@ -1,16 +1,111 @@
+import sys
+
 from django.contrib import admin
-from .models import Category, Product, Order, OrderItem
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+from .models import Category, Product, Order, OrderItem, Cart, CartItem
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, unfiltered changelists of large tables use the planner's
+    row estimate (pg_class.reltuples) instead of a full COUNT(*). Filtered
+    lists, small tables and other databases get the exact count.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
+
+
+class FastChangeListMixin:
+    """
+    Changelist settings for tables that grow large: estimated counts, and no
+    second COUNT(*) of the unfiltered table for filtered views ("x of y" is
+    replaced by a "Show all" link).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+MAX_ID = 2 ** 63 - 1
+
+
+class PrefixSearchMixin:
+    """
+    Admin search using only index-friendly lookups instead of LIKE '%term%'
+    over every search field: an exact id for numeric terms, otherwise a
+    case-insensitive prefix match on lower(field) for each
+    prefix_search_fields entry. Needs an index on Lower(field).
+
+    On SQLite, whose default collation orders by code point, the prefix is a
+    range scan (lower(field) >= term AND lower(field) < next string). Other
+    databases may use a linguistic collation, where that range is not the set
+    of strings starting with term, so they get lower(field) LIKE 'term%',
+    which PostgreSQL only serves from the index under the C collation. The
+    range is also skipped when term ends in the highest code point, which
+    has no successor.
+    """
+    prefix_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        # ids are 64-bit; longer numbers overflow the database driver
+        is_id = term.isascii() and term.isdigit() and int(term) <= MAX_ID
+        condition = Q(pk=int(term)) if is_id else Q()
+        # SQLite's lower() only folds ASCII, so non-ASCII capitals in a title stay as they are
+        variants = {term.lower()} if term.isascii() else {term.lower(), term, term.capitalize()}
+        code_point_order = connections[queryset.db].vendor == "sqlite"
+        lowered = {}
+        for field in self.prefix_search_fields:
+            alias = f"{field}_lower"
+            lowered[alias] = Lower(field)
+            for variant in variants:
+                condition |= prefix_condition(alias, variant, code_point_order)
+        return queryset.alias(**lowered).filter(condition), False
+
+
+def prefix_condition(field, prefix, code_point_order):
+    last = ord(prefix[-1])
+    if not code_point_order or last == sys.maxunicode:
+        return Q(**{f"{field}__startswith": prefix})
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix[:-1] + chr(last + 1)})
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "slug")
     prepopulated_fields = {"slug": ("name",)}
+    # used by ProductAdmin's category autocomplete
+    search_fields = ("name", "slug")
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(FastChangeListMixin, PrefixSearchMixin, admin.ModelAdmin):
     list_display = ("id", "title", "category", "price", "stock", "is_active", "created")
     list_filter = ("is_active", "category")
-    search_fields = ("title", "description")
+    list_select_related = ("category",)
+    autocomplete_fields = ("category",)
+    # id or title prefix; full-text search over descriptions is the API's /products/?search=
+    search_fields = ("title",)
+    prefix_search_fields = ("title",)
+    search_help_text = "Product id or start of the title"
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -18,8 +113,32 @@ class OrderItemInline(admin.TabularInline):
     can_delete = False
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = ("id", "user", "status", "total_price", "created_at")
     list_filter = ("status",)
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
     inlines = [OrderItemInline]
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    readonly_fields = ("product", "quantity", "unit_price", "available", "added_at")
+    can_delete = False
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
+@admin.register(Cart)
+class CartAdmin(FastChangeListMixin, admin.ModelAdmin):
+    # sort by updated_at to find abandoned carts (see CartQuerySet.abandoned)
+    list_display = ("id", "user", "item_count", "subtotal", "unavailable_count", "updated_at")
+    list_filter = ("updated_at",)
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    ordering = ("updated_at",)
+    inlines = [CartItemInline]
@@ -6,4 +6,5 @@ class ShopConfig(AppConfig):
     name = 'shop'
     
     def ready(self):
+        import shop.checks
         import shop.signals
@@ -0,0 +1,197 @@
+"""
+In-memory prefix index over active product titles for search-box autocomplete.
+
+The index is a sorted list of keys, one per word start of each title
+("non-stick pan" -> "non-stick pan", "pan"), case-folded, with a parallel
+array of product ids. A lookup is a bisect to the first key >= the query
+followed by a short scan while keys still start with it, so it costs
+microseconds and never touches the database. Titles and prices for the
+results are kept in a dict by id.
+
+Lifecycle:
+  - built at worker start (Ecom.warmup for preloaded servers, the
+    post_worker_init hook in gunicorn.conf.py otherwise), or lazily on the
+    first lookup; the build remembers the last catalog change seq
+  - Product saves/deletes in this process are applied incrementally once
+    they commit (shop.signals)
+  - changes made by other workers are read from the catalog change feed
+    (shop.changes) at most every CHECK_INTERVAL seconds: one indexed query
+    for the product changes after the remembered seq, one for those
+    products' current rows, each applied with the same incremental update.
+    This needs no shared cache.
+  - more than REBUILD_THRESHOLD pending changes (a bulk import) start a
+    full rebuild in a background thread; lookups keep using the current
+    index until it is swapped in
+"""
+import bisect
+import logging
+import threading
+import time
+from array import array
+from decimal import Decimal
+
+from django.db import connections
+
+from . import changes
+from .models import CatalogChange, Product
+
+logger = logging.getLogger(__name__)
+
+# seconds between reads of the change feed
+CHECK_INTERVAL = 1.0
+# more pending product changes than this are handled with a rebuild
+REBUILD_THRESHOLD = 2000
+# later words of long titles add little and cost memory
+MAX_WORDS = 8
+
+
+def format_price(price):
+    return f"{Decimal(str(price)):.2f}"
+
+
+def title_keys(title):
+    folded = title.casefold()
+    keys, start = [], 0
+    for word in folded.split()[:MAX_WORDS]:
+        start = folded.index(word, start)
+        keys.append(folded[start:])
+        start += len(word)
+    return keys
+
+
+class ProductTitleIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # last change feed seq reflected in the index; None until built
+        self._seq = None
+        self._checked_at = 0.0
+        self._rebuilding = False
+        self._keys = []
+        self._ids = array("q")
+        self._products = {}
+
+    def __len__(self):
+        return len(self._products)
+
+    def build(self):
+        # read first: changes logged while the rows are read are applied again by the next sync
+        seq = changes.last_seq()
+        rows = Product.objects.filter(is_active=True).values_list("id", "title", "price").iterator()
+        products = {pk: (title, format_price(price)) for pk, title, price in rows}
+        entries = sorted((key, pk) for pk, (title, _price) in products.items() for key in title_keys(title))
+        with self._lock:
+            self._keys = [key for key, _pk in entries]
+            self._ids = array("q", (pk for _key, pk in entries))
+            self._products = products
+            self._seq = seq
+            self._checked_at = time.monotonic()
+
+    def ensure_loaded(self, force=False):
+        if self._seq is None:
+            with self._lock:
+                if self._seq is None:
+                    self.build()
+            return
+        now = time.monotonic()
+        if force or now - self._checked_at >= CHECK_INTERVAL:
+            self._checked_at = now
+            self.sync()
+
+    def sync(self):
+        """Apply the product changes logged (by any worker) since the last build or sync."""
+        rows, has_more = changes.changes_after(self._seq, REBUILD_THRESHOLD, kind=CatalogChange.PRODUCT)
+        if has_more:
+            self.rebuild_in_background()
+            return
+        if not rows:
+            return
+        ids = {row["object_id"] for row in rows}
+        current = {
+            pk: (title, format_price(price))
+            for pk, title, price in Product.objects.filter(pk__in=ids, is_active=True).values_list("id", "title", "price")
+        }
+        with self._lock:
+            for pk in ids:
+                self._apply(pk, current.get(pk))
+            self._seq = max(self._seq, rows[-1]["seq"])
+
+    def rebuild_in_background(self):
+        """Rebuild in a thread; lookups are served from the current index meanwhile."""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.build()
+            except Exception:
+                logger.exception("autocomplete index rebuild failed")
+            finally:
+                self._rebuilding = False
+                connections.close_all()
+
+        threading.Thread(target=run, name="autocomplete-rebuild", daemon=True).start()
+
+    def invalidate(self):
+        """Drop this process's copy; the next lookup rebuilds."""
+        self._seq = None
+
+    def search(self, query, limit=10):
+        """[{"id", "title", "price"}, ...] for titles with a word starting with query."""
+        self.ensure_loaded()
+        query = " ".join(query.casefold().split())
+        if not query:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            keys, ids = self._keys, self._ids
+            position = bisect.bisect_left(keys, query)
+            while position < len(keys) and keys[position].startswith(query) and len(results) < limit:
+                pk = ids[position]
+                if pk not in seen:
+                    seen.add(pk)
+                    title, price = self._products[pk]
+                    results.append({"id": pk, "title": title, "price": price})
+                position += 1
+        return results
+
+    def _remove(self, pk):
+        title, _price = self._products.pop(pk)
+        for key in title_keys(title):
+            position = bisect.bisect_left(self._keys, key)
+            while self._ids[position] != pk:
+                position += 1
+            del self._keys[position]
+            del self._ids[position]
+
+    def _add(self, pk, title, price):
+        self._products[pk] = (title, price)
+        for key in title_keys(title):
+            position = bisect.bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._ids.insert(position, pk)
+
+    def _apply(self, pk, entry):
+        """Make pk's entry (title, price), or None for not listed; returns True if it changed."""
+        if self._products.get(pk) == entry:
+            return False
+        if pk in self._products:
+            self._remove(pk)
+        if entry is not None:
+            self._add(pk, *entry)
+        return True
+
+    def update(self, product):
+        """Apply a saved product; returns True if the index changed."""
+        entry = (product.title, format_price(product.price)) if product.is_active else None
+        with self._lock:
+            # not built here yet: the first lookup loads current data
+            return self._seq is not None and self._apply(product.pk, entry)
+
+    def discard(self, pk):
+        with self._lock:
+            return self._seq is not None and self._apply(pk, None)
+
+
+index = ProductTitleIndex()
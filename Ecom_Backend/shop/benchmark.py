@@ -0,0 +1,435 @@
+"""
+Load-test scenarios for the shop API.
+
+Used by `manage.py benchmark`. Each scenario issues one request per
+iteration through a transport (the in-process Django test client, or HTTP
+against a real gunicorn/uvicorn server) and records latency, status and the
+query count reported by PerformanceMiddleware's Server-Timing header.
+"""
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from .models import Category, Product
+
+User = get_user_model()
+
+API_PREFIX = "/api/v1"
+BENCH_PASSWORD = "bench-pass-123"
+SEARCH_TERMS = ["phone", "shirt", "watch", "bag", "shoes", "cotton", "wireless", "smart"]
+
+# environment for spawned servers: no real email, every request instrumented, quiet perf logs
+SERVER_ENV = {
+    "EMAIL_BACKEND": "django.core.mail.backends.locmem.EmailBackend",
+    "SHOP_PERF_SAMPLE_RATE": "1.0",
+    "SHOP_PERF_SERVER_TIMING": "True",
+    "SHOP_PERF_LOG_LEVEL": "ERROR",
+}
+
+_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def queries_from_server_timing(header):
+    match = _QUERIES_RE.search(header or "")
+    return int(match.group(1)) if match else None
+
+
+class ClientTransport:
+    """In-process transport through django.test.Client (one client per thread)."""
+
+    name = "client"
+
+    def __init__(self, extra_headers=None):
+        self._local = threading.local()
+        self.extra_headers = {
+            "HTTP_" + name.upper().replace("-", "_"): value for name, value in (extra_headers or {}).items()
+        }
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = Client()
+        return self._local.client
+
+    def request(self, method, path, data=None, token=None, headers=None):
+        meta = dict(self.extra_headers)
+        meta.update({"HTTP_" + k.upper().replace("-", "_"): v for k, v in (headers or {}).items()})
+        if token:
+            meta["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        body = json.dumps(data) if data is not None else None
+        start = time.perf_counter()
+        if method == "GET":
+            resp = self._client().get(path, **meta)
+        else:
+            resp = self._client().generic(method, path, body or "", content_type="application/json", **meta)
+        elapsed = time.perf_counter() - start
+        return resp.status_code, elapsed, resp.get("Server-Timing"), resp.content
+
+    def cpu_seconds(self):
+        # server and client share this process, so this includes the client's share
+        return time.process_time()
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """HTTP/1.1 keep-alive transport against a running server (one connection per thread)."""
+
+    name = "http"
+
+    def __init__(self, host, port, extra_headers=None, server_pid=None):
+        self.host = host
+        self.port = port
+        self.extra_headers = extra_headers or {}
+        self.server_pid = server_pid
+        self._local = threading.local()
+        self._connections = []
+
+    def _conn(self):
+        if not hasattr(self._local, "conn"):
+            self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self._connections.append(self._local.conn)
+        return self._local.conn
+
+    def request(self, method, path, data=None, token=None, headers=None):
+        headers = dict(self.extra_headers, **(headers or {}))
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+            headers["Content-Type"] = "application/json"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        conn = self._conn()
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            content = resp.read()
+        except (ConnectionError, http.client.HTTPException):
+            # server closed a kept-alive connection; retry once on a fresh one
+            conn.close()
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            content = resp.read()
+        elapsed = time.perf_counter() - start
+        return resp.status, elapsed, resp.getheader("Server-Timing"), content
+
+    def cpu_seconds(self):
+        return process_tree_cpu_seconds(self.server_pid) if self.server_pid else None
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+
+
+def process_tree_cpu_seconds(pid):
+    """user+system CPU of a process and its direct children (gunicorn master + workers), Linux only."""
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces; fields after it are fixed
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(entry) == pid or int(fields[1]) == pid:
+            total += int(fields[11]) + int(fields[12])
+    return total / ticks
+
+
+def seed_benchmark_data(users=20):
+    """
+    Prepare an (empty, migrated) database for a run: catalog fixtures with
+    effectively unlimited stock, `users` shoppers and one staff user.
+    """
+    from django.core.management import call_command
+
+    if not Category.objects.exists():
+        call_command("loaddata", "categories", "products", verbosity=0)
+    Product.objects.update(stock=10 ** 9, is_active=True)
+    for i in range(users):
+        User.objects.create_user(username=f"bench_user_{i}", email="", password=BENCH_PASSWORD)
+    User.objects.create_user(username="bench_admin", email="", password=BENCH_PASSWORD, is_staff=True)
+
+
+@contextmanager
+def benchmark_database(users=20):
+    """
+    Create, seed and finally destroy a throwaway database (a temporary SQLite
+    file when the project runs on SQLite, so spawned servers can share it).
+    Yields the database NAME.
+    """
+    db_file = tempfile.NamedTemporaryFile(prefix="bench-", suffix=".sqlite3", delete=False)
+    db_file.close()
+    if connection.vendor == "sqlite":
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = db_file.name
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    perf_logger = logging.getLogger("shop.perf")
+    old_level = perf_logger.level
+    perf_logger.setLevel(logging.ERROR)
+    try:
+        with override_settings(
+            EMAIL_BACKEND=SERVER_ENV["EMAIL_BACKEND"],
+            SHOP_PERF={"SAMPLE_RATE": 1.0, "SERVER_TIMING": True},
+        ):
+            seed_benchmark_data(users=users)
+            yield connection.settings_dict["NAME"]
+    finally:
+        perf_logger.setLevel(old_level)
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if os.path.exists(db_file.name):
+            os.unlink(db_file.name)
+
+
+@contextmanager
+def database_copy(db_name):
+    """
+    Yield the path of a fresh copy of the (SQLite) benchmark database, so a
+    run that writes (orders, registrations) does not enlarge the database
+    the next run is measured on. Removed afterwards.
+    """
+    copy = tempfile.NamedTemporaryFile(prefix="bench-run-", suffix=".sqlite3", delete=False)
+    copy.close()
+    source, target = sqlite3.connect(db_name), sqlite3.connect(copy.name)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    try:
+        yield copy.name
+    finally:
+        if os.path.exists(copy.name):
+            os.unlink(copy.name)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def gunicorn_server(db_name, profile, overrides=None, startup_timeout=30, extra_headers=None):
+    """
+    Run gunicorn with the project's gunicorn.conf.py and the given profile
+    (see Ecom/server.py) against db_name; yields an HTTPTransport to it.
+    `overrides` are extra env vars such as WEB_CONCURRENCY.
+    """
+    port = free_port()
+    env = dict(os.environ, DATABASE_NAME=str(db_name), GUNICORN_PROFILE=profile,
+               GUNICORN_BIND=f"127.0.0.1:{port}", **SERVER_ENV)
+    env.update(overrides or {})
+    cmd = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--log-level", "warning"]
+    server = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env)
+    transport = HTTPTransport("127.0.0.1", port, extra_headers=extra_headers, server_pid=server.pid)
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"gunicorn did not start within {startup_timeout}s")
+                time.sleep(0.2)
+        yield transport
+    finally:
+        transport.close()
+        server.terminate()
+        server.wait(timeout=30)
+
+
+class BenchmarkContext:
+    """Catalog ids and pre-issued access tokens shared by the scenarios."""
+
+    def __init__(self, transport, users=20):
+        self.transport = transport
+        self.product_ids = list(Product.objects.filter(is_active=True).values_list("id", flat=True))
+        self.category_ids = list(Category.objects.values_list("id", flat=True))
+        self.page_count = max(1, math.ceil(len(self.product_ids) / 12))
+        self.user_tokens = [self.login(f"bench_user_{i}") for i in range(users)]
+        self.admin_token = self.login("bench_admin")
+        self.run_id = random.getrandbits(32)
+
+    def login(self, username):
+        status, _elapsed, _timing, content = self.transport.request(
+            "POST", f"{API_PREFIX}/auth/token/", {"username": username, "password": BENCH_PASSWORD},
+            headers={"Accept-Encoding": "identity"},
+        )
+        if status != 200:
+            raise RuntimeError(f"could not log in {username}: HTTP {status}")
+        return json.loads(content)["access"]
+
+
+def browse(ctx, rng, i):
+    page = rng.randint(1, ctx.page_count)
+    return ctx.transport.request("GET", f"{API_PREFIX}/products/?page={page}")
+
+
+def filter_products(ctx, rng, i):
+    params = f"category__id={rng.choice(ctx.category_ids)}&price__gte={rng.choice([0, 100, 500])}"
+    params += f"&ordering={rng.choice(['price', '-price', '-rating', '-created'])}"
+    return ctx.transport.request("GET", f"{API_PREFIX}/products/?{params}")
+
+
+def search(ctx, rng, i):
+    return ctx.transport.request("GET", f"{API_PREFIX}/products/?search={rng.choice(SEARCH_TERMS)}")
+
+
+def register_login(ctx, rng, i):
+    username = f"bench_{ctx.run_id}_{i}"
+    status, elapsed, timing, content = ctx.transport.request(
+        "POST", f"{API_PREFIX}/auth/register/",
+        {"username": username, "email": "", "password": BENCH_PASSWORD, "password2": BENCH_PASSWORD},
+    )
+    if status != 201:
+        return status, elapsed, timing, content
+    status, login_elapsed, login_timing, content = ctx.transport.request(
+        "POST", f"{API_PREFIX}/auth/token/", {"username": username, "password": BENCH_PASSWORD}
+    )
+    queries = (queries_from_server_timing(timing) or 0) + (queries_from_server_timing(login_timing) or 0)
+    return status, elapsed + login_elapsed, f'db;dur=0;desc="{queries} queries"', content
+
+
+def checkout(ctx, rng, i):
+    items = [
+        {"product_id": pid, "quantity": rng.randint(1, 3)}
+        for pid in rng.sample(ctx.product_ids, min(len(ctx.product_ids), rng.randint(1, 5)))
+    ]
+    payload = {"items": items, "shipping_address": "1 Benchmark Road"}
+    return ctx.transport.request("POST", f"{API_PREFIX}/orders/", payload, token=rng.choice(ctx.user_tokens))
+
+
+def admin_orders(ctx, rng, i):
+    return ctx.transport.request("GET", f"{API_PREFIX}/orders/?ordering=-created_at", token=ctx.admin_token)
+
+
+SCENARIOS = {
+    "browse": browse,
+    "filter": filter_products,
+    "search": search,
+    "register_login": register_login,
+    "checkout": checkout,
+    "admin_orders": admin_orders,
+}
+
+
+# scenario mixes used to pick server settings per kind of traffic
+WORKLOADS = {
+    "catalog": ["browse", "filter", "search"],
+    "checkout": ["checkout", "register_login", "admin_orders"],
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples, wall_time, cpu_seconds=None):
+    """samples: list of (status, elapsed_seconds, query_count or None, response_bytes)."""
+    latencies = sorted(elapsed * 1000 for _status, elapsed, _q, _b in samples)
+    queries = [q for _status, _elapsed, q, _b in samples if q is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for status, _e, _q, _b in samples if status >= 400),
+        "rps": round(len(samples) / wall_time, 2) if wall_time else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        # body bytes as sent (compressed when the server compressed them)
+        "bytes_per_request": round(sum(b for _s, _e, _q, b in samples) / len(samples)) if samples else 0,
+        "cpu_ms_per_request": round(cpu_seconds * 1000 / len(samples), 3) if samples and cpu_seconds is not None else None,
+    }
+
+
+def run_scenario(ctx, scenario, iterations, concurrency=1, warmup=0, seed=0):
+    rng_lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def one(i):
+        # draw the request parameters under a lock so runs are reproducible for a given seed
+        with rng_lock:
+            local_rng = random.Random(rng.random())
+        status, elapsed, timing, content = scenario(ctx, local_rng, i)
+        return status, elapsed, queries_from_server_timing(timing), len(content)
+
+    for i in range(warmup):
+        one(-1 - i)
+
+    cpu_start = ctx.transport.cpu_seconds()
+    start = time.perf_counter()
+    if concurrency <= 1:
+        samples = [one(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, range(iterations)))
+    wall_time = time.perf_counter() - start
+    cpu_end = ctx.transport.cpu_seconds()
+    cpu = cpu_end - cpu_start if cpu_start is not None and cpu_end is not None else None
+    return summarize(samples, wall_time, cpu)
+
+
+def run_suite(transport, scenarios=None, iterations=100, concurrency=1, warmup=5, seed=0, users=20):
+    ctx = BenchmarkContext(transport, users=users)
+    results = {}
+    for offset, name in enumerate(scenarios or SCENARIOS):
+        results[name] = run_scenario(
+            ctx, SCENARIOS[name], iterations, concurrency=concurrency, warmup=warmup, seed=seed + offset
+        )
+    return results
+
+
+def compare(current, baseline, threshold=10.0):
+    """
+    Compare two result documents scenario by scenario. Returns a list of
+    (scenario, metric, baseline, current, change_pct, regressed) rows.
+    """
+    rows = []
+    lower_is_better = ("p50_ms", "p95_ms", "p99_ms", "queries_per_request", "bytes_per_request", "cpu_ms_per_request")
+    for name, stats in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        for metric in lower_is_better + ("rps",):
+            old, new = base.get(metric), stats.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            regressed = change > threshold if metric in lower_is_better else change < -threshold
+            rows.append((name, metric, old, new, round(change, 1), regressed))
+    return rows
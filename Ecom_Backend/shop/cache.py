@@ -0,0 +1,67 @@
+"""
+Shared-cache helpers for catalog data.
+
+The catalog version is a stamp stored in the default cache. Anything derived
+from products or categories (precompressed catalog pages, ...) includes it in
+its cache key, so bumping it, which shop.signals does once every Product or
+Category save/delete commits, invalidates all of it at once in every worker that
+shares the cache. With the default per-process LocMemCache that is only the
+current worker; multi-worker deployments need a shared backend (see
+shop.checks).
+The category version works the same way for the per-process category
+registry (shop.categories). Product queryset .update() bumps the catalog
+version itself (shop.models.ProductQuerySet); .bulk_create() and category
+querysets bypass signals, so call bump_catalog_version() (or
+shop.categories.invalidate_categories() for categories) after using them.
+The related-products version covers only what is derived from the
+RelatedProduct table, so rebuilding it leaves the other cached pages alone.
+"""
+import time
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = "shop:catalog:version"
+CATEGORY_VERSION_KEY = "shop:categories:version"
+RELATED_VERSION_KEY = "shop:related:version"
+
+
+def version_stamp(key):
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add() so concurrent first readers agree on one stamp
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    version = time.time_ns()
+    cache.set(key, version, None)
+    return version
+
+
+def catalog_version():
+    return version_stamp(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def category_version():
+    return version_stamp(CATEGORY_VERSION_KEY)
+
+
+def bump_category_version():
+    """New category stamp; also bumps the catalog version since pages embed categories."""
+    bump_version(CATEGORY_VERSION_KEY)
+    bump_catalog_version()
+
+
+def related_version():
+    return version_stamp(RELATED_VERSION_KEY)
+
+
+def bump_related_version():
+    bump_version(RELATED_VERSION_KEY)
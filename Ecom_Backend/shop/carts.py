@@ -0,0 +1,185 @@
+"""
+Server-side cart operations.
+
+Every mutation adjusts the cart's subtotal, item_count and unavailable_count
+by the delta it causes (one UPDATE with F() expressions), so reading a cart
+never has to aggregate its lines. Lines cache the product price and an
+`available` flag; refresh_product() keeps those in step when a product's
+price, stock or is_active change. checkout() turns the whole cart into an
+order with a fixed number of queries regardless of how many lines it has.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cart, CartItem, Order, OrderItem
+
+
+class CartError(Exception):
+    """Raised when a cart operation cannot be applied; `detail` is API-ready."""
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def is_available(product, quantity):
+    return product.is_active and product.stock >= quantity
+
+
+def get_cart(user):
+    cart, _created = Cart.objects.get_or_create(user=user)
+    return cart
+
+
+def _apply_delta(cart, subtotal=Decimal("0"), items=0, unavailable=0):
+    Cart.objects.filter(pk=cart.pk).update(
+        subtotal=F("subtotal") + subtotal,
+        item_count=F("item_count") + items,
+        unavailable_count=F("unavailable_count") + unavailable,
+        updated_at=timezone.now(),
+    )
+
+
+def _write_line(cart, product, quantity, add=False, must_exist=False):
+    """
+    Set the product's line to quantity (0 removes it), or add quantity to it,
+    and apply the resulting delta. The cart row is locked first, so concurrent
+    writes to one cart run one after another and each starts from the line
+    the previous one left.
+    """
+    with transaction.atomic():
+        list(Cart.objects.select_for_update().filter(pk=cart.pk).values_list("pk", flat=True))
+        line = CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+        if line is None:
+            if must_exist:
+                raise CartError({"product_id": "Product is not in the cart."})
+            if quantity == 0:
+                return None
+            available = is_available(product, quantity)
+            line, created = CartItem.objects.get_or_create(
+                cart=cart, product=product,
+                defaults={"quantity": quantity, "unit_price": product.price, "available": available},
+            )
+            if created:
+                _apply_delta(cart, subtotal=line.line_total(), items=quantity, unavailable=0 if available else 1)
+                return line
+            # created concurrently on a backend without row locks; apply on top of it
+
+        old_total, old_quantity = line.line_total(), line.quantity
+        old_unavailable = 0 if line.available else 1
+        new_quantity = old_quantity + quantity if add else quantity
+
+        if new_quantity == 0:
+            line.delete()
+            new_total, new_unavailable = Decimal("0"), 0
+        else:
+            available = is_available(product, new_quantity)
+            line.quantity, line.unit_price, line.available = new_quantity, product.price, available
+            line.save(update_fields=["quantity", "unit_price", "available"])
+            new_total, new_unavailable = line.line_total(), 0 if available else 1
+
+        _apply_delta(
+            cart,
+            subtotal=new_total - old_total,
+            items=new_quantity - old_quantity,
+            unavailable=new_unavailable - old_unavailable,
+        )
+    return line if new_quantity else None
+
+
+def add_item(cart, product, quantity=1):
+    """Add quantity of product, merging with an existing line."""
+    return _write_line(cart, product, quantity, add=True)
+
+
+def set_quantity(cart, product, quantity):
+    return _write_line(cart, product, quantity, must_exist=True)
+
+
+def remove_item(cart, product):
+    _write_line(cart, product, 0, must_exist=True)
+
+
+def clear(cart):
+    with transaction.atomic():
+        CartItem.objects.filter(cart=cart).delete()
+        Cart.objects.filter(pk=cart.pk).update(
+            subtotal=0, item_count=0, unavailable_count=0, updated_at=timezone.now()
+        )
+
+
+def refresh_product(product):
+    """
+    Re-price and re-check availability of every cart line for product, then
+    recompute the totals of only the carts that actually changed.
+    """
+    lines = CartItem.objects.filter(product=product)
+    if product.is_active:
+        available = Q(quantity__lte=product.stock)
+        flipped = Q(available=True, quantity__gt=product.stock) | Q(available=False, quantity__lte=product.stock)
+    else:
+        available, flipped = Value(False), Q(available=True)
+    changed = list(lines.filter(~Q(unit_price=product.price) | flipped).values_list("cart_id", flat=True))
+    if not changed:
+        return 0
+    lines.filter(cart_id__in=changed).update(unit_price=product.price, available=available)
+    recompute_totals(Cart.objects.filter(pk__in=changed))
+    return len(changed)
+
+
+def carts_holding(product):
+    return list(CartItem.objects.filter(product=product).values_list("cart_id", flat=True))
+
+
+def recompute_totals(carts):
+    """Set-based full recompute of subtotal/item_count/unavailable_count for a queryset of carts."""
+    per_cart = CartItem.objects.filter(cart=OuterRef("pk")).values("cart")
+    money = DecimalField(max_digits=12, decimal_places=2)
+    carts.update(
+        subtotal=Coalesce(
+            Subquery(per_cart.annotate(s=Sum(F("unit_price") * F("quantity"), output_field=money)).values("s")),
+            Value(Decimal("0")), output_field=money,
+        ),
+        item_count=Coalesce(Subquery(per_cart.annotate(n=Sum("quantity")).values("n")), Value(0)),
+        unavailable_count=Coalesce(
+            Subquery(per_cart.annotate(n=Count("pk", filter=Q(available=False))).values("n")), Value(0)
+        ),
+    )
+
+
+def checkout(cart, shipping_address=""):
+    """
+    Create an order from the cart and empty it. Stock and active state are
+    re-checked for all lines in one query; prices come from the lines'
+    cached unit_price, which refresh_product() keeps current.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        lines = list(
+            CartItem.objects.filter(cart=cart).values_list(
+                "product_id", "quantity", "unit_price", "product__title", "product__stock", "product__is_active"
+            )
+        )
+        if not lines:
+            raise CartError({"items": "Cart is empty."})
+        errors = [
+            {f"items[{idx}]": f"Not enough stock for product '{title}' (available {stock})."}
+            if active else {f"items[{idx}]": f"Product '{title}' is no longer available."}
+            for idx, (_pid, qty, _price, title, stock, active) in enumerate(lines)
+            if not active or stock < qty
+        ]
+        if errors:
+            raise CartError({"items": errors})
+
+        total = sum((price * qty for _pid, qty, price, _t, _s, _a in lines), Decimal("0"))
+        order = Order.objects.create(user=cart.user, shipping_address=shipping_address, total_price=total)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pid, quantity=qty, price_snapshot=price)
+            for pid, qty, price, _title, _stock, _active in lines
+        ])
+        clear(cart)
+    return order
@@ -0,0 +1,106 @@
+"""
+Process-local category registry.
+
+Categories are a small table read on almost every catalog request, so each
+worker keeps all of them in memory, keyed by id and by slug, and loads them
+with one query. The registry is tied to shop.cache.category_version(): when
+any worker changes a category (shop.signals bumps the stamp) every other
+worker sharing the cache sees the new stamp and reloads on its next lookup.
+
+To keep lookups off the shared cache, the stamp is checked at most every
+CHECK_INTERVAL seconds. The stamp only reaches other workers through a
+shared cache, so two fallbacks keep a worker correct without one (the
+default LocMemCache): an id or slug that is not found is looked up in the
+database once and, if it exists, the registry is reloaded; and a copy older
+than MAX_AGE seconds is reloaded whatever the stamp says, which bounds how
+long renamed or deleted categories can be served. Pages stored in the
+catalog page cache (shop.compression) are rendered after refresh(), so a
+page keyed by a new catalog version never embeds categories from before it.
+The Category instances
+handed out are shared; treat them as read-only.
+"""
+import threading
+import time
+
+from .cache import bump_category_version, category_version
+from .models import Category
+
+# seconds between checks of the shared version stamp
+CHECK_INTERVAL = 1.0
+# seconds after which the registry is reloaded even if the stamp has not moved
+MAX_AGE = 60.0
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._by_id = {}
+        self._by_slug = {}
+        self._ordered = []
+
+    def _current(self, version):
+        return version == self._version and time.monotonic() - self._loaded_at < MAX_AGE
+
+    def _load(self, version):
+        categories = list(Category.objects.order_by("id"))
+        self._by_id = {c.pk: c for c in categories}
+        self._by_slug = {c.slug: c for c in categories}
+        self._ordered = categories
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked_at < CHECK_INTERVAL:
+            return
+        version = category_version()
+        self._checked_at = now
+        if self._current(version):
+            return
+        with self._lock:
+            if not self._current(version):
+                self._load(version)
+
+    def _lookup(self, field, value):
+        by = "_by_id" if field == "pk" else "_by_slug"
+        self._refresh()
+        category = getattr(self, by).get(value)
+        if category is None:
+            self._refresh(force=True)
+            category = getattr(self, by).get(value)
+        if category is None and Category.objects.filter(**{field: value}).exists():
+            # created by a worker whose stamp bump has not reached this one
+            with self._lock:
+                self._load(category_version())
+            category = getattr(self, by).get(value)
+        return category
+
+    def refresh(self):
+        """Check the version stamp now, without waiting for CHECK_INTERVAL."""
+        self._refresh(force=True)
+
+    def invalidate(self):
+        """Drop this process's copy; the next lookup reloads."""
+        self._version = None
+
+    def all(self):
+        self._refresh()
+        return self._ordered
+
+    def get(self, pk):
+        return self._lookup("pk", pk)
+
+    def get_by_slug(self, slug):
+        return self._lookup("slug", slug)
+
+
+registry = CategoryRegistry()
+
+
+def invalidate_categories():
+    """Call after changing categories without signals (bulk_create, update, ...)."""
+    bump_category_version()
+    registry.invalidate()
@@ -0,0 +1,190 @@
+"""
+Catalog change feed.
+
+Every product or category save/delete appends a CatalogChange row
+(shop.signals); bulk writers that bypass signals call record_bulk(). Rows
+carry a monotonically increasing seq, so a downstream consumer (CDN purger,
+search indexer, offline cache) keeps the last seq it processed and asks
+for `?after=<seq>`: syncing costs O(changes), not O(catalog). A change only
+says what changed; consumers fetch current data themselves (e.g.
+/products/?ids=...).
+
+seq comes from an autoincrement, so it gives insert order, not commit
+order: on PostgreSQL or MySQL a transaction holding seq N can commit after
+seq N+1 is already visible, and a consumer that moved past N+1 would never
+see N. So the feed is cut at the first missing seq: changes after a gap are
+held back until the gap fills (the transaction commits) or the change
+following it is GAP_TIMEOUT seconds old, after which the missing seq is
+taken to be a rollback (or a compacted change) and skipped. This is best
+effort: a transaction that stays open longer than GAP_TIMEOUT after writing
+its change can still be missed by consumers that moved on. SQLite allows one
+writer at a time, so there rows commit in seq order and GAP_TIMEOUT
+defaults to 0 (no holding).
+
+compact() keeps only the latest change per object, that is per (kind,
+object_id): per product and per category. Since that change has the highest
+seq of the object's changes, a consumer at any position still sees every
+object that changed after it. Delete tombstones are kept. The seqs it
+removes look like gaps, so a consumer positioned before them may be held
+for up to GAP_TIMEOUT when the change after them is recent.
+
+Long-polls and streams keep a request open, so they belong on gthread or
+async workers (gunicorn.conf.py turns them off for sync workers).
+Configured through settings.SHOP_CHANGES.
+"""
+import itertools
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .cache import bump_version, version_stamp
+from .models import CatalogChange
+
+# bumped on every write, so waiting consumers poll the cache instead of the table
+VERSION_KEY = "shop:changes:version"
+
+DEFAULTS = {
+    # long-poll: longest ?wait= accepted, and how often the log is re-checked.
+    # MAX_WAIT and STREAM_DURATION must stay well below the worker timeout
+    "MAX_WAIT": 20,
+    "POLL_INTERVAL": 0.5,
+    # Server-Sent Events: seconds a stream stays open before the client reconnects
+    "STREAM_DURATION": 20,
+    # False on sync workers, where each long-poll or stream would hold a whole
+    # worker process: ?wait= is then ignored and event streams are refused (406)
+    "STREAMING": True,
+    # seconds changes after a missing seq are held back for (see above); None
+    # picks 0 for SQLite and 30 s for databases with concurrent writers
+    "GAP_TIMEOUT": None,
+    # seconds between SSE keep-alive comments
+    "HEARTBEAT": 15,
+    "PAGE_SIZE": 100,
+    "MAX_PAGE_SIZE": 1000,
+}
+
+
+def changes_settings():
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SHOP_CHANGES", {}))
+    if conf["GAP_TIMEOUT"] is None:
+        conf["GAP_TIMEOUT"] = 0 if connection.vendor == "sqlite" else 30.0
+    return conf
+
+
+def bump():
+    transaction.on_commit(lambda: bump_version(VERSION_KEY))
+
+
+def record(kind, object_id, action=CatalogChange.UPSERT):
+    change = CatalogChange.objects.create(kind=kind, object_id=object_id, action=action)
+    # waiting consumers re-read once the change is committed
+    bump()
+    return change
+
+
+def record_bulk(kind, object_ids, action=CatalogChange.UPSERT, batch_size=5000):
+    """Log changes made without signals (bulk_create, update, raw SQL)."""
+    object_ids = iter(object_ids)
+    written = 0
+    while True:
+        batch = [
+            CatalogChange(kind=kind, object_id=pk, action=action)
+            for pk in itertools.islice(object_ids, batch_size)
+        ]
+        if not batch:
+            if written:
+                bump()
+            return written
+        CatalogChange.objects.bulk_create(batch)
+        written += len(batch)
+
+
+def settled_before(conf):
+    """Changes written before this are old enough for a gap in front of them to be final."""
+    return timezone.now() - timedelta(seconds=conf["GAP_TIMEOUT"])
+
+
+def contiguous(seqs, after, settled):
+    """
+    How many of (seq, created_at) pairs, ordered by seq and starting after
+    `after`, can be served: up to the first one that follows a missing seq
+    while it is newer than settled.
+    """
+    expected = after + 1
+    for count, (seq, created_at) in enumerate(seqs):
+        if seq != expected and created_at > settled:
+            return count
+        expected = seq + 1
+    return len(seqs)
+
+
+def last_seq(conf=None):
+    """Highest servable seq: a snapshot taken now misses nothing up to it."""
+    conf = conf or changes_settings()
+    latest = CatalogChange.objects.order_by("-seq")
+    if not conf["GAP_TIMEOUT"]:
+        return latest.values_list("seq", flat=True).first() or 0
+    settled = settled_before(conf)
+    # changes older than GAP_TIMEOUT are served whatever precedes them; only newer ones can be held
+    base = latest.filter(created_at__lte=settled).values_list("seq", flat=True).first() or 0
+    recent = list(CatalogChange.objects.filter(seq__gt=base).order_by("seq").values_list("seq", "created_at"))
+    served = contiguous(recent, base, settled)
+    return recent[served - 1][0] if served else base
+
+
+def changes_after(after, limit, kind=None, conf=None):
+    """
+    Up to limit changes with seq > after (of one kind, if given), plus
+    whether more are waiting. Stops at a seq gap that may still be an open
+    transaction; has_more is then False.
+    """
+    conf = conf or changes_settings()
+    queryset = CatalogChange.objects.filter(seq__gt=after)
+    # gaps are found across all kinds, so with GAP_TIMEOUT the kind is filtered afterwards
+    if kind is not None and not conf["GAP_TIMEOUT"]:
+        queryset = queryset.filter(kind=kind)
+    rows = list(
+        queryset.order_by("seq")
+        .values("seq", "kind", "object_id", "action", "created_at")[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    if conf["GAP_TIMEOUT"]:
+        served = contiguous([(row["seq"], row["created_at"]) for row in rows], after, settled_before(conf))
+        if served < len(rows):
+            rows, has_more = rows[:served], False
+    rows = rows[:limit]
+    if kind is not None and conf["GAP_TIMEOUT"]:
+        rows = [row for row in rows if row["kind"] == kind]
+    return rows, has_more
+
+
+def wait_for_changes(after, limit, wait, conf=None):
+    """
+    changes_after(), but if there is nothing yet, wait up to `wait` seconds
+    for a change. Only the shared cache stamp is polled; the table is read
+    again when it moves, and once more at the end.
+    """
+    conf = conf or changes_settings()
+    rows, has_more = changes_after(after, limit, conf=conf)
+    deadline = time.monotonic() + wait
+    seen = version_stamp(VERSION_KEY)
+    while not rows and time.monotonic() < deadline:
+        time.sleep(min(conf["POLL_INTERVAL"], max(deadline - time.monotonic(), 0)))
+        current = version_stamp(VERSION_KEY)
+        if current != seen or time.monotonic() >= deadline:
+            seen = current
+            rows, has_more = changes_after(after, limit, conf=conf)
+    return rows, has_more
+
+
+def compact():
+    """Delete every change superseded by a later change of the same object; returns the count."""
+    later = CatalogChange.objects.filter(
+        kind=OuterRef("kind"), object_id=OuterRef("object_id"), seq__gt=OuterRef("seq")
+    )
+    deleted, _ = CatalogChange.objects.filter(Exists(later)).delete()
+    return deleted
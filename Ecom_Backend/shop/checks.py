@@ -0,0 +1,29 @@
+"""
+System checks for settings the shop's cross-worker features depend on.
+"""
+from django.conf import settings
+from django.core import checks
+
+# backends whose entries live in one process and are invisible to other workers
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        checks.Warning(
+            f"The default cache ({backend}) is not shared between worker processes.",
+            hint=(
+                "Version bumps then only reach the worker that made the change: other workers keep "
+                "serving cached catalog pages until CACHE_TIMEOUT. Set CACHE_BACKEND/CACHE_LOCATION "
+                "to a shared cache (Redis, Memcached, database) when running more than one worker."
+            ),
+            id="shop.W001",
+        )
+    ]
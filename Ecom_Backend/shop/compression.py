@@ -0,0 +1,194 @@
+"""
+Negotiated gzip/brotli compression for API responses, with precompressed
+caching of catalog pages.
+
+CompressionMiddleware:
+  - picks brotli (if the `brotli` package is installed) or gzip from
+    Accept-Encoding, honouring q-values
+  - compresses JSON responses at least MIN_SIZE bytes long
+  - for anonymous GET requests under CACHE_PATHS (public catalog endpoints
+    whose output does not depend on the user), stores the final, already
+    compressed body per URL and encoding, so a page is rendered and
+    compressed once and then served straight from the cache
+
+Cached pages are keyed by shop.cache.catalog_version(), which product and
+category changes bump, and /related/ pages also by related_version(), which
+rebuilding the recommendations bumps. Pages and the stamp live in the default cache, so
+with several workers it must be a shared backend: under the per-process
+LocMemCache a bump only reaches the worker that made the change, and the
+others serve their stale pages for up to CACHE_TIMEOUT (`manage.py check
+--deploy` warns about this, shop.W001). Configured through
+settings.SHOP_COMPRESSION.
+"""
+import gzip
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .cache import catalog_version, related_version
+from .categories import registry as category_registry
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+DEFAULTS = {
+    # responses smaller than this are not worth compressing
+    "MIN_SIZE": 512,
+    "CONTENT_TYPES": ("application/json",),
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 4,
+    # cached pages are compressed once, so they can afford a slower, denser setting
+    "CACHED_GZIP_LEVEL": 9,
+    "CACHED_BROTLI_QUALITY": 9,
+    "CACHE_PATHS": ("/api/v1/products/", "/api/v1/categories/"),
+    # under CACHE_PATHS but not cached: autocomplete is answered from memory, and
+    # one entry per typed prefix would only push catalog pages out of the cache
+    "CACHE_EXCLUDE_PATHS": ("/api/v1/products/autocomplete/",),
+    # seconds; 0 disables the page cache
+    "CACHE_TIMEOUT": 300,
+}
+
+# path suffix -> version stamp, besides the catalog version, that such pages depend on
+PAGE_VERSIONS = {"/related/": related_version}
+
+# headers that belong to one particular response and must not be replayed from the cache
+UNCACHED_HEADERS = {"content-length", "date", "set-cookie", "server-timing"}
+
+_ACCEPT_RE = re.compile(r"\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?")
+
+
+def compression_settings():
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SHOP_COMPRESSION", {}))
+    return conf
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding):
+    """Return the best supported encoding for an Accept-Encoding header, or None."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        match = _ACCEPT_RE.match(part)
+        if not match:
+            continue
+        try:
+            weights[match.group(1).lower()] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, cached=False, conf=None):
+    conf = conf or compression_settings()
+    if encoding == "br":
+        return brotli.compress(data, quality=conf["CACHED_BROTLI_QUALITY" if cached else "BROTLI_QUALITY"])
+    return gzip.compress(data, compresslevel=conf["CACHED_GZIP_LEVEL" if cached else "GZIP_LEVEL"], mtime=0)
+
+
+def is_json(response, conf):
+    if response.streaming:
+        return False
+    return response.get("Content-Type", "").split(";")[0].strip() in conf["CONTENT_TYPES"]
+
+
+def is_compressible(response, conf):
+    if response.has_header("Content-Encoding") or not is_json(response, conf):
+        return False
+    return len(response.content) >= conf["MIN_SIZE"]
+
+
+def encode_response(response, encoding, cached=False, conf=None):
+    """Compress response in place (if worthwhile) and set the related headers."""
+    conf = conf or compression_settings()
+    patch_vary_headers(response, ("Accept-Encoding",))
+    if encoding is None or not is_compressible(response, conf):
+        return response
+    body = compress(response.content, encoding, cached=cached, conf=conf)
+    if len(body) >= len(response.content):
+        return response
+    response.content = body
+    response["Content-Length"] = str(len(body))
+    response["Content-Encoding"] = encoding
+    # the body is no longer byte-identical to what the ETag described
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response["ETag"] = "W/" + etag
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Place near the top of MIDDLEWARE (after PerformanceMiddleware and CORS) so
+    cache hits skip the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = compression_settings()
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+        key = self.cache_key(request, encoding, conf)
+        if key is not None:
+            entry = cache.get(key)
+            if entry is not None:
+                return self.from_cache(entry, request)
+
+        if key is not None:
+            # the page is stored under the current catalog version, so it must not be
+            # rendered from a category registry that has not checked its stamp yet
+            category_registry.refresh()
+        response = self.get_response(request)
+        response = encode_response(response, encoding, cached=key is not None, conf=conf)
+
+        if key is not None and response.status_code == 200 and is_json(response, conf):
+            headers = {k: v for k, v in response.items() if k.lower() not in UNCACHED_HEADERS}
+            cache.set(key, (response.content, headers), conf["CACHE_TIMEOUT"])
+            response["X-Catalog-Cache"] = "miss"
+        return response
+
+    def cache_key(self, request, encoding, conf):
+        if request.method != "GET" or not conf["CACHE_TIMEOUT"]:
+            return None
+        if not request.path.startswith(tuple(conf["CACHE_PATHS"])):
+            return None
+        if request.path.startswith(tuple(conf["CACHE_EXCLUDE_PATHS"])):
+            return None
+        # browsers asking for the browsable API get it rendered live
+        if "text/html" in request.META.get("HTTP_ACCEPT", ""):
+            return None
+        # a hit returns before authentication runs: requests with credentials
+        # must go through it, so that a bad token still gets its 401
+        if "HTTP_AUTHORIZATION" in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        # the absolute URI is part of the key because image_url is built from the request host
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        version = catalog_version()
+        for suffix, extra_version in PAGE_VERSIONS.items():
+            if request.path.endswith(suffix):
+                version = f"{version}.{extra_version()}"
+        return f"shop:catalog-page:{version}:{encoding or 'identity'}:{url}"
+
+    def from_cache(self, entry, request):
+        body, headers = entry
+        response = HttpResponse(body)
+        for name, value in headers.items():
+            response[name] = value
+        response["Content-Length"] = str(len(body))
+        response["X-Catalog-Cache"] = "hit"
+        return response
@@ -0,0 +1,288 @@
+"""
+Synthetic catalog/user/order generator behind `manage.py generate_data`.
+
+Everything is derived from a single seed: each chunk of rows gets its own
+random.Random(seed, table, chunk) so a chunk's content does not depend on
+how many worker processes produced it. Rows are written with bulk_create,
+so model signals (welcome / order confirmation emails) are not fired.
+
+Distributions:
+  - category size and product/user popularity follow a Zipf-like power law
+  - prices are log-normal around a per-category base price
+  - ~8% of products are out of stock, the rest have log-normal stock levels
+  - ratings cluster around 4.0; ~5% of products are inactive
+"""
+import bisect
+import itertools
+import random
+from array import array
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+
+from .cache import bump_catalog_version
+from .categories import invalidate_categories, registry as category_registry
+from .changes import record_bulk
+from .models import CatalogChange, Category, Product, Order, OrderItem
+
+User = get_user_model()
+
+CATEGORY_PREFIX = "gen-"
+USERNAME_PREFIX = "gen_user_"
+DEFAULT_PASSWORD = "password123"
+
+ADJECTIVES = [
+    "Classic", "Premium", "Slim", "Wireless", "Organic", "Smart", "Compact", "Deluxe", "Eco", "Ultra",
+    "Vintage", "Portable", "Handmade", "Pro", "Lightweight", "Rugged", "Soft", "Bold", "Essential", "Travel",
+]
+NOUNS = [
+    "Shirt", "Jeans", "Sneakers", "Watch", "Backpack", "Earbuds", "Speaker", "Lamp", "Mug", "Wallet",
+    "Hoodie", "Kurta", "Saree", "Perfume", "Sunglasses", "Charger", "Stand", "Bottle", "Jacket", "Handbag",
+]
+WORDS = (
+    "durable comfortable stylish everyday premium quality material design lightweight breathable "
+    "long lasting battery crafted finish warranty fits perfect gift modern classic easy care "
+    "water resistant ergonomic compact travel friendly eco sourced carefully tested"
+).split()
+STATUS_WEIGHTS = [("completed", 60), ("shipped", 15), ("processing", 10), ("pending", 10), ("cancelled", 5)]
+ITEMS_PER_ORDER_WEIGHTS = [45, 25, 15, 10, 5]  # 1..5 lines
+
+
+def chunk_rng(seed, table, chunk):
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def zipf_cum_weights(n, rng, exponent=1.1):
+    """Cumulative Zipf weights over n items, with popularity ranks shuffled across items."""
+    ranks = list(range(1, n + 1))
+    rng.shuffle(ranks)
+    return array("d", itertools.accumulate(1.0 / r ** exponent for r in ranks))
+
+
+def weighted_index(cum_weights, rng):
+    return bisect.bisect_left(cum_weights, rng.random() * cum_weights[-1])
+
+
+def chunks(total, size):
+    for index, start in enumerate(range(0, total, size)):
+        yield index, start, min(size, total - start)
+
+
+def generate_categories(count, seed):
+    rng = chunk_rng(seed, "category", 0)
+    existing = set(Category.objects.filter(slug__startswith=CATEGORY_PREFIX).values_list("slug", flat=True))
+    new = []
+    for i in range(count):
+        slug = f"{CATEGORY_PREFIX}{i}"
+        if slug not in existing:
+            new.append(Category(name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}s {i}", slug=slug))
+    if new:
+        created = Category.objects.bulk_create(new)
+        record_bulk(CatalogChange.CATEGORY, [c.pk for c in created])
+        invalidate_categories()
+    return [c.pk for c in category_registry.all() if c.slug.startswith(CATEGORY_PREFIX)]
+
+
+def category_profile(category_ids, seed):
+    """Per-category base price and cumulative size weights (a few huge categories, a long tail)."""
+    rng = chunk_rng(seed, "category-profile", 0)
+    base_prices = {cid: rng.lognormvariate(6.5, 1.0) for cid in category_ids}
+    return base_prices, zipf_cum_weights(len(category_ids), rng, exponent=0.9)
+
+
+def generate_products_chunk(seed, chunk, start, count, category_ids, batch_size):
+    rng = chunk_rng(seed, "product", chunk)
+    base_prices, cum = category_profile(category_ids, seed)
+    batch = []
+    for i in range(start, start + count):
+        category_id = category_ids[weighted_index(cum, rng)]
+        price = max(Decimal("9.00"), Decimal(int(rng.lognormvariate(0, 0.6) * base_prices[category_id])) - Decimal("0.01"))
+        stock = 0 if rng.random() < 0.08 else int(rng.lognormvariate(3.5, 1.0))
+        rating = min(5.0, max(1.0, rng.gauss(4.0, 0.6)))
+        description = " ".join(rng.choices(WORDS, k=rng.randint(8, 80))).capitalize() + "."
+        batch.append(Product(
+            category_id=category_id,
+            title=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+            subtitle=" ".join(rng.choices(WORDS, k=3)).title(),
+            description=description,
+            price=price,
+            stock=min(stock, 100000),
+            rating=Decimal(f"{rating:.1f}"),
+            is_active=rng.random() >= 0.05,
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+    return count
+
+
+def generate_users_chunk(seed, chunk, start, count, password_hash, batch_size):
+    rng = chunk_rng(seed, "user", chunk)
+    users = [
+        User(
+            username=f"{USERNAME_PREFIX}{i}",
+            email=f"{USERNAME_PREFIX}{i}@example.com" if rng.random() < 0.9 else "",
+            password=password_hash,
+        )
+        for i in range(start, start + count)
+    ]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return count
+
+
+class OrderSampler:
+    """
+    Compact (array-backed) view of the generated products and users, used to
+    draw order lines with skewed popularity. Loaded once per process.
+    """
+
+    def __init__(self, seed):
+        rng = chunk_rng(seed, "popularity", 0)
+        self.product_ids = array("q")
+        self.product_cents = array("q")
+        rows = (
+            Product.objects.filter(category__slug__startswith=CATEGORY_PREFIX, is_active=True)
+            .order_by("id").values_list("id", "price").iterator(chunk_size=10000)
+        )
+        for pid, price in rows:
+            self.product_ids.append(pid)
+            self.product_cents.append(int(price * 100))
+        self.user_ids = array("q", User.objects.filter(username__startswith=USERNAME_PREFIX)
+                              .order_by("id").values_list("id", flat=True).iterator(chunk_size=10000))
+        if not self.product_ids or not self.user_ids:
+            raise ValueError("generate products and users before orders")
+        self.product_cum = zipf_cum_weights(len(self.product_ids), rng)
+        self.user_cum = zipf_cum_weights(len(self.user_ids), rng, exponent=0.8)
+
+
+_sampler = None
+
+
+def get_sampler(seed):
+    global _sampler
+    if _sampler is None:
+        _sampler = OrderSampler(seed)
+    return _sampler
+
+
+def generate_orders_chunk(seed, chunk, start, count, batch_size):
+    rng = chunk_rng(seed, "order", chunk)
+    sampler = get_sampler(seed)
+    statuses, status_weights = zip(*STATUS_WEIGHTS)
+    status_cum = list(itertools.accumulate(status_weights))
+    line_counts = range(1, len(ITEMS_PER_ORDER_WEIGHTS) + 1)
+    line_cum = list(itertools.accumulate(ITEMS_PER_ORDER_WEIGHTS))
+
+    done = 0
+    while done < count:
+        size = min(batch_size, count - done)
+        orders, lines = [], []
+        for _ in range(size):
+            picked = {}
+            for _line in range(rng.choices(line_counts, cum_weights=line_cum)[0]):
+                idx = weighted_index(sampler.product_cum, rng)
+                picked[idx] = picked.get(idx, 0) + rng.choices((1, 2, 3), weights=(80, 15, 5))[0]
+            total_cents = sum(sampler.product_cents[idx] * qty for idx, qty in picked.items())
+            orders.append(Order(
+                user_id=sampler.user_ids[weighted_index(sampler.user_cum, rng)],
+                status=rng.choices(statuses, cum_weights=status_cum)[0],
+                total_price=Decimal(total_cents) / 100,
+                shipping_address=f"{rng.randint(1, 999)} {rng.choice(NOUNS)} Street",
+            ))
+            lines.append(picked)
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(
+                [
+                    OrderItem(
+                        order_id=order.pk,
+                        product_id=sampler.product_ids[idx],
+                        quantity=qty,
+                        price_snapshot=Decimal(sampler.product_cents[idx]) / 100,
+                    )
+                    for order, picked in zip(orders, lines)
+                    for idx, qty in picked.items()
+                ],
+                batch_size=batch_size,
+            )
+        done += size
+    return count
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+    # never share a DB connection inherited from the parent process
+    connections.close_all()
+
+
+def run_chunks(func, jobs, workers, progress=None):
+    """Run func(*job) for every job, in-process or across `workers` processes."""
+    if workers <= 1:
+        for job in jobs:
+            done = func(*job)
+            if progress:
+                progress(done)
+        return
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                             initializer=_init_worker) as pool:
+        for future in as_completed([pool.submit(func, *job) for job in jobs]):
+            done = future.result()
+            if progress:
+                progress(done)
+
+
+def default_password_hash():
+    # hashing once and reusing the hash keeps user generation cheap
+    return make_password(DEFAULT_PASSWORD)
+
+
+def clear_generated():
+    """Delete everything a previous generate_data run created."""
+    OrderItem.objects.filter(order__user__username__startswith=USERNAME_PREFIX).delete()
+    Order.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    Product.objects.filter(category__slug__startswith=CATEGORY_PREFIX).delete()
+    Category.objects.filter(slug__startswith=CATEGORY_PREFIX).delete()
+
+
+def generate(categories, products, users, orders, seed=0, batch_size=5000, workers=1, log=None):
+    """Generate the requested number of rows of each table (categories are topped up, not duplicated)."""
+    global _sampler
+    log = log or (lambda message: None)
+    chunk_size = batch_size * 10
+
+    category_ids = generate_categories(categories, seed)
+    log(f"categories: {len(category_ids)}")
+
+    if products:
+        last_id = Product.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        jobs = [(seed, c, start, n, category_ids, batch_size) for c, start, n in chunks(products, chunk_size)]
+        run_chunks(generate_products_chunk, jobs, workers, progress=lambda n: log(f"products: +{n}"))
+        # bulk_create skips signals: log the new products and invalidate what they feed
+        new_ids = Product.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True)
+        record_bulk(CatalogChange.PRODUCT, new_ids.iterator())
+        bump_catalog_version()
+
+    if users:
+        password_hash = default_password_hash()
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        jobs = [(seed, c, offset + start, n, password_hash, batch_size) for c, start, n in chunks(users, chunk_size)]
+        run_chunks(generate_users_chunk, jobs, workers, progress=lambda n: log(f"users: +{n}"))
+
+    if orders:
+        # build the sampler before forking so workers share it copy-on-write
+        _sampler = None
+        get_sampler(seed)
+        jobs = [(seed, c, start, n, batch_size) for c, start, n in chunks(orders, chunk_size)]
+        run_chunks(generate_orders_chunk, jobs, workers, progress=lambda n: log(f"orders: +{n}"))
+        _sampler = None
@@ -0,0 +1,24 @@
+import django_filters
+
+from .categories import registry as category_registry
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    # id or slug; resolved through the category registry so slugs need no join
+    category = django_filters.CharFilter(method="filter_category", label="Category id or slug")
+
+    class Meta:
+        model = Product
+        fields = {
+            "price": ["exact", "gte", "lte", "gt", "lt"],
+            "category__id": ["exact"],
+            "stock": ["exact", "gte", "lte"],
+        }
+
+    def filter_category(self, queryset, name, value):
+        value = value.strip()
+        category = category_registry.get(int(value)) if value.isdigit() else category_registry.get_by_slug(value)
+        if category is None:
+            return queryset.none()
+        return queryset.filter(category_id=category.pk)
@@ -0,0 +1,157 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A client that may retry a request sends the same `Idempotency-Key` header
+on every attempt. The first attempt claims the key (one INSERT, committed
+before the work starts) and stores its response when done; later attempts
+with the same key and body get that response replayed, marked with
+`Idempotent-Replayed: true`, without running the view again.
+
+  - a key reused with a different request body -> 422
+  - a key whose first request is still running -> 409, retry later; the
+    claim is a lease of LOCK_TIMEOUT seconds, so if that worker died without
+    releasing it (killed on timeout, OOM) a retry after the lease takes over
+  - 2xx and 4xx responses (including DRF APIExceptions such as validation
+    errors) are stored in the same transaction as the work itself; 5xx
+    responses and other exceptions roll it back and release the key so the
+    work can be retried
+  - keys are scoped per user and expire after TTL seconds; expired rows are
+    ignored, reclaimed on reuse and deleted by `manage.py purge_idempotency_keys`
+
+Configured through settings.SHOP_IDEMPOTENCY.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+DEFAULTS = {
+    # seconds a stored response is replayed for
+    "TTL": 24 * 60 * 60,
+    # seconds an unfinished claim blocks retries; keep above the worker timeout
+    # (GUNICORN_TIMEOUT) so a request that is merely slow is not run twice
+    "LOCK_TIMEOUT": 90,
+    "MAX_KEY_LENGTH": 255,
+}
+
+
+def idempotency_settings():
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SHOP_IDEMPOTENCY", {}))
+    return conf
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def purge_expired(now=None):
+    """Delete expired keys; returns the number removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+def claim(user, key, request_hash, ttl, lock_timeout=DEFAULTS["LOCK_TIMEOUT"]):
+    """
+    Claim key for a new request. Returns (record, created); an existing,
+    unexpired record is returned as-is for the caller to replay or reject.
+    An unfinished claim older than lock_timeout seconds is abandoned and
+    taken over like an expired one. A retry costs one SELECT.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+    stale_before = now - timedelta(seconds=lock_timeout)
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=request_hash, expires_at=expires_at
+                ), True
+        except IntegrityError:
+            # a concurrent request claimed it first
+            return IdempotencyKey.objects.get(user=user, key=key), False
+    abandoned = record.status_code is None and record.created_at <= stale_before
+    if record.expires_at > now and not abandoned:
+        return record, False
+    # expired or abandoned: take it over, unless another request already did
+    reclaimable = Q(expires_at__lte=now) | Q(status_code__isnull=True, created_at__lte=stale_before)
+    taken = IdempotencyKey.objects.filter(reclaimable, pk=record.pk).update(
+        fingerprint=request_hash, status_code=None, response_body=None, created_at=now, expires_at=expires_at
+    )
+    if taken:
+        record.refresh_from_db()
+        return record, True
+    return IdempotencyKey.objects.get(pk=record.pk), False
+
+
+class IdempotentCreateMixin:
+    """
+    ViewSet mixin that makes create() honour the Idempotency-Key header.
+    Requests without the header are handled as before.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+
+        conf = idempotency_settings()
+        key = key.strip()
+        if not key or len(key) > conf["MAX_KEY_LENGTH"]:
+            return Response(
+                {"detail": f"{HEADER} must be 1-{conf['MAX_KEY_LENGTH']} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        request_hash = fingerprint(request)
+        record, created = claim(request.user, key, request_hash, conf["TTL"], conf["LOCK_TIMEOUT"])
+        if not created:
+            return self.replay(record, request_hash)
+
+        try:
+            # the created object and the stored response commit together, so a
+            # worker dying in between cannot leave an order behind an open claim
+            with transaction.atomic():
+                try:
+                    response = super().create(request, *args, **kwargs)
+                except APIException as exc:
+                    # validation, permission, ... errors are the request's answer too
+                    response = self.handle_exception(exc)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                else:
+                    record.status_code = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=["status_code", "response_body"])
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            record.delete()
+        return response
+
+    def replay(self, record, request_hash):
+        if record.fingerprint != request_hash:
+            return Response(
+                {"detail": f"{HEADER} was already used with a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record.status_code is None:
+            return Response(
+                {"detail": f"A request with this {HEADER} is still being processed."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(record.response_body, status=record.status_code, headers={"Idempotent-Replayed": "true"})
@@ -0,0 +1,218 @@
+"""
+Per-request performance instrumentation for the shop API.
+
+PerformanceMiddleware records, for a sampled fraction of requests:
+  - total wall time
+  - DB query count and time (via connection.execute_wrapper)
+  - serializer time (TimedSerializerMixin)
+  - authentication time (InstrumentedViewMixin)
+
+and emits them as a Server-Timing header plus one structured log line.
+Slow queries and repeated identical queries (likely N+1) are logged
+separately, tagged with the view that issued them, e.g. "ProductViewSet.list".
+
+Configured through settings.SHOP_PERF (see DEFAULTS below).
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("shop.perf")
+slow_query_logger = logging.getLogger("shop.perf.queries")
+
+DEFAULTS = {
+    # fraction of requests to instrument (0.0 - 1.0)
+    "SAMPLE_RATE": 0.01,
+    # emit the Server-Timing response header: True (every sampled response),
+    # "staff" (only to staff users) or False; it reveals query counts and timings
+    "SERVER_TIMING": "staff",
+    # queries slower than this are logged individually
+    "SLOW_QUERY_MS": 100,
+    # the same SQL issued this many times in one request is reported as N+1
+    "DUPLICATE_QUERY_THRESHOLD": 5,
+}
+
+_current = ContextVar("shop_perf_metrics", default=None)
+
+
+def perf_settings():
+    conf = dict(DEFAULTS)
+    conf.update(getattr(settings, "SHOP_PERF", {}))
+    return conf
+
+
+def get_current_metrics():
+    """Return the RequestMetrics of the request being handled, or None if it is not sampled."""
+    return _current.get()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.view = None
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.timings = {}
+        self.queries = []
+        self._depth = Counter()
+
+    @property
+    def db_count(self):
+        return len(self.queries)
+
+    @property
+    def db_time(self):
+        return sum(duration for _sql, duration in self.queries)
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def duplicate_queries(self, threshold):
+        counts = Counter(sql for sql, _duration in self.queries)
+        return [(sql, n) for sql, n in counts.most_common() if n >= threshold]
+
+    def slow_queries(self, threshold_ms):
+        return [(sql, d) for sql, d in self.queries if d * 1000 >= threshold_ms]
+
+    def server_timing(self):
+        parts = [f'db;dur={self.db_time * 1000:.2f};desc="{self.db_count} queries"']
+        for name, seconds in self.timings.items():
+            parts.append(f"{name};dur={seconds * 1000:.2f}")
+        parts.append(f"total;dur={self.total * 1000:.2f}")
+        return ", ".join(parts)
+
+    def as_dict(self):
+        data = {
+            "view": self.view,
+            "total_ms": round(self.total * 1000, 2),
+            "db_queries": self.db_count,
+            "db_ms": round(self.db_time * 1000, 2),
+        }
+        for name, seconds in self.timings.items():
+            data[f"{name}_ms"] = round(seconds * 1000, 2)
+        return data
+
+
+@contextmanager
+def timed(name):
+    """
+    Add the time spent in the block to the current request's `name` timing.
+    Re-entrant: nested blocks with the same name (e.g. nested serializers)
+    are only counted once, by the outermost block.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics._depth[name]:
+        yield
+        return
+    metrics._depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._depth[name] -= 1
+        metrics.add(name, time.perf_counter() - start)
+
+
+class QueryRecorder:
+    """execute_wrapper callable that appends (sql, duration) to the request metrics."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.metrics.queries.append((sql, time.perf_counter() - start))
+
+
+class TimedSerializerMixin:
+    """Serializer mixin that reports to_representation time as the 'serializer' timing."""
+
+    def to_representation(self, instance):
+        with timed("serializer"):
+            return super().to_representation(instance)
+
+
+class InstrumentedViewMixin:
+    """APIView mixin that reports request.user resolution as the 'auth' timing."""
+
+    def perform_authentication(self, request):
+        with timed("auth"):
+            super().perform_authentication(request)
+
+
+def view_label(view_func, request):
+    cls = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if cls is None:
+        return getattr(view_func, "__name__", None)
+    method = request.method.lower()
+    actions = getattr(view_func, "actions", None) or {}
+    return f"{cls.__name__}.{actions.get(method, method)}"
+
+
+class PerformanceMiddleware:
+    """
+    Place first in MIDDLEWARE so the total covers the whole stack.
+    Unsampled requests pay for one random() call and nothing else.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = perf_settings()
+        if conf["SAMPLE_RATE"] <= 0 or random.random() >= conf["SAMPLE_RATE"]:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                recorder = QueryRecorder(metrics)
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        metrics.total = time.perf_counter() - metrics.started
+
+        if self.expose_timing(request, conf["SERVER_TIMING"]):
+            response["Server-Timing"] = metrics.server_timing()
+        self.log(request, response, metrics, conf)
+        return response
+
+    def expose_timing(self, request, setting):
+        if setting == "staff":
+            # DRF copies the user it authenticated (JWT included) onto the Django request
+            user = getattr(request, "user", None)
+            return bool(user is not None and user.is_staff)
+        return bool(setting)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = view_label(view_func, request)
+
+    def log(self, request, response, metrics, conf):
+        record = metrics.as_dict()
+        record.update(method=request.method, path=request.path, status=response.status_code)
+        logger.info(json.dumps(record), extra={"perf": record})
+
+        for sql, duration in metrics.slow_queries(conf["SLOW_QUERY_MS"]):
+            slow_query_logger.warning(
+                "slow query in %s (%.1f ms): %s", metrics.view, duration * 1000, sql,
+                extra={"view": metrics.view, "duration_ms": round(duration * 1000, 2), "sql": sql},
+            )
+        for sql, count in metrics.duplicate_queries(conf["DUPLICATE_QUERY_THRESHOLD"]):
+            slow_query_logger.warning(
+                "possible N+1 in %s: query repeated %d times: %s", metrics.view, count, sql,
+                extra={"view": metrics.view, "count": count, "sql": sql},
+            )
@@ -0,0 +1,147 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Ecom.server import PROFILES
+from shop import benchmark
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def server_overrides(options):
+    overrides = {}
+    if options.get("workers"):
+        overrides["WEB_CONCURRENCY"] = str(options["workers"])
+    if options.get("worker_class"):
+        overrides["GUNICORN_WORKER_CLASS"] = options["worker_class"]
+    return overrides
+
+
+def write_results(document, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2))
+    return path
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the API load-test scenarios against a throwaway database and report "
+        "p50/p95/p99 latency, requests/sec and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transport", choices=["client", "gunicorn"], default="client",
+                            help="in-process test client, or HTTP against a spawned gunicorn")
+        parser.add_argument("--profile", choices=list(PROFILES), default="catalog",
+                            help="gunicorn profile from Ecom/server.py")
+        parser.add_argument("--workers", type=int, help="override the profile's worker count")
+        parser.add_argument("--worker-class", choices=["sync", "gthread", "uvicorn"],
+                            help="override the profile's worker class")
+        parser.add_argument("--scenario", action="append", choices=list(benchmark.SCENARIOS),
+                            help="scenario to run (repeatable); default: all")
+        parser.add_argument("--accept-encoding", default="gzip, deflate, br",
+                            help='Accept-Encoding sent with every request ("" for uncompressed)')
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--output", help="results file (default: benchmarks/<commit>-<transport>.json)")
+        parser.add_argument("--compare", help="earlier results file to compare against")
+        parser.add_argument("--threshold", type=float, default=10.0,
+                            help="percent change counted as a regression in --compare")
+
+    def handle(self, *args, **options):
+        kwargs = {
+            "scenarios": options["scenario"],
+            "iterations": options["iterations"],
+            "concurrency": options["concurrency"],
+            "warmup": options["warmup"],
+            "seed": options["seed"],
+            "users": options["users"],
+        }
+        headers = {"Accept-Encoding": options["accept_encoding"]} if options["accept_encoding"] else {}
+        with benchmark.benchmark_database(users=options["users"]) as db_name:
+            if options["transport"] == "client":
+                results = benchmark.run_suite(benchmark.ClientTransport(headers), **kwargs)
+            else:
+                try:
+                    with benchmark.gunicorn_server(
+                        db_name, options["profile"], server_overrides(options), extra_headers=headers
+                    ) as transport:
+                        results = benchmark.run_suite(transport, **kwargs)
+                except RuntimeError as exc:
+                    raise CommandError(str(exc))
+
+        server = options["transport"] != "client"
+        document = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "transport": options["transport"],
+                "profile": options["profile"] if server else None,
+                "server_overrides": server_overrides(options) if server else None,
+                "iterations": options["iterations"],
+                "concurrency": options["concurrency"],
+                "accept_encoding": options["accept_encoding"],
+                "seed": options["seed"],
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "scenarios": results,
+        }
+        self.report(document)
+
+        output = write_results(document, options["output"] or settings.BASE_DIR / "benchmarks" / (
+            f"{document['meta']['commit']}-{options['transport']}.json"
+        ))
+        self.stdout.write(f"results written to {output}")
+
+        if options["compare"]:
+            self.compare(document, options["compare"], options["threshold"])
+
+    def report(self, document):
+        header = (
+            f"{'scenario':<16}{'reqs':>7}{'err':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'q/req':>8}{'bytes/req':>11}{'cpu ms/req':>12}"
+        )
+        self.stdout.write(header)
+        for name, s in document["scenarios"].items():
+            qpr = "-" if s["queries_per_request"] is None else f"{s['queries_per_request']:.1f}"
+            cpu = "-" if s["cpu_ms_per_request"] is None else f"{s['cpu_ms_per_request']:.2f}"
+            self.stdout.write(
+                f"{name:<16}{s['requests']:>7}{s['errors']:>5}{s['rps']:>10.1f}"
+                f"{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{qpr:>8}"
+                f"{s['bytes_per_request']:>11}{cpu:>12}"
+            )
+
+    def compare(self, document, baseline_path, threshold):
+        try:
+            baseline = json.loads(Path(baseline_path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"cannot read baseline {baseline_path}: {exc}")
+        self.stdout.write(f"\ncompared with {baseline.get('meta', {}).get('commit', baseline_path)}:")
+        regressions = 0
+        for name, metric, old, new, change, regressed in benchmark.compare(document, baseline, threshold):
+            line = f"  {name:<16}{metric:<22}{old:>10}{new:>10}{change:>+8.1f}%"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + "  REGRESSION"))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} metric(s) regressed by more than {threshold}%"))
@@ -0,0 +1,84 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from shop import benchmark, datagen
+from shop.models import Order, Product
+from shop.renderers import FastJSONParser, FastJSONRenderer, orjson
+from shop.serializers import OrderSerializer, ProductSerializer
+
+
+def best_of(func, repeat, number):
+    """Fastest per-call time in microseconds over `repeat` rounds of `number` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's stdlib JSONRenderer/JSONParser with shop.renderers on "
+        "product and order pages, and check that the rendered bytes are identical."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--number", type=int, default=50)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed; shop.renderers falls back to stdlib json"))
+        size = options["page_size"]
+        with benchmark.benchmark_database(users=0):
+            datagen.generate(categories=5, products=size * 2, users=20, orders=size * 2, seed=0)
+            request = RequestFactory().get("/api/v1/products/")
+            pages = {
+                "products": {
+                    "count": size, "next": None, "previous": None,
+                    "results": ProductSerializer(
+                        Product.objects.select_related("category")[:size], many=True, context={"request": request}
+                    ).data,
+                },
+                "orders": {
+                    "count": size, "next": None, "previous": None,
+                    "results": OrderSerializer(
+                        Order.objects.select_related("user").prefetch_related("items__product__category")[:size],
+                        many=True, context={"request": request},
+                    ).data,
+                },
+            }
+
+        stdlib_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        stdlib_parser, fast_parser = JSONParser(), FastJSONParser()
+        for name, data in pages.items():
+            expected = stdlib_renderer.render(data, "application/json")
+            rendered = fast_renderer.render(data, "application/json")
+            if rendered != expected:
+                self.stdout.write(self.style.ERROR(f"{name}: rendered output differs from JSONRenderer"))
+
+            timings = {
+                "render stdlib": best_of(lambda: stdlib_renderer.render(data, "application/json"),
+                                         options["repeat"], options["number"]),
+                "render fast": best_of(lambda: fast_renderer.render(data, "application/json"),
+                                       options["repeat"], options["number"]),
+                "parse stdlib": best_of(lambda: stdlib_parser.parse(io.BytesIO(expected)),
+                                        options["repeat"], options["number"]),
+                "parse fast": best_of(lambda: fast_parser.parse(io.BytesIO(expected)),
+                                      options["repeat"], options["number"]),
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} page ({size} rows, {len(expected)} bytes)"))
+            for label, us in timings.items():
+                self.stdout.write(f"  {label:<14}{us:>10.1f} us")
+            self.stdout.write(
+                f"  speedup: render x{timings['render stdlib'] / timings['render fast']:.1f}, "
+                f"parse x{timings['parse stdlib'] / timings['parse fast']:.1f}"
+            )
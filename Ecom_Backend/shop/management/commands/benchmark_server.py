@@ -0,0 +1,120 @@
+import math
+import os
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Ecom.server import PROFILES, build_config, unavailable_reason
+from shop import benchmark
+from shop.management.commands.benchmark import git_commit, write_results
+
+
+def best_profile(results):
+    """
+    Lowest geometric-mean p95 across the workload's scenarios among error-free
+    runs (so one slow scenario, e.g. password hashing in register_login, does
+    not drown out the others); ties go to higher total rps.
+    """
+    clean = {name: r for name, r in results.items() if not any(s["errors"] for s in r.values())}
+    if not clean:
+        return None
+
+    def score(name):
+        stats = clean[name].values()
+        log_p95 = sum(math.log(max(s["p95_ms"], 0.001)) for s in stats) / len(stats)
+        return (log_p95, -sum(s["rps"] for s in stats))
+
+    return min(clean, key=score)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the gunicorn profiles from Ecom/server.py on the catalog-read and "
+        "checkout workloads and record the best settings per workload."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", action="append", choices=list(PROFILES),
+                            help="profile to compare (repeatable); default: all")
+        parser.add_argument("--workload", action="append", choices=list(benchmark.WORKLOADS),
+                            help="workload to run (repeatable); default: all")
+        parser.add_argument("--workers", type=int, help="same worker count for every profile")
+        parser.add_argument("--iterations", type=int, default=300)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--output", default=str(settings.BASE_DIR / "benchmarks" / "server-profiles.json"))
+
+    def handle(self, *args, **options):
+        profiles = options["profile"] or list(PROFILES)
+        workloads = options["workload"] or list(benchmark.WORKLOADS)
+        overrides = {"WEB_CONCURRENCY": str(options["workers"])} if options["workers"] else {}
+
+        # a fallback (e.g. async without uvicorn) would be ranked under a name it did not run as
+        unavailable = {}
+        for profile in profiles:
+            reason = unavailable_reason(profile)
+            if reason:
+                unavailable[profile] = reason
+                self.stdout.write(self.style.WARNING(f"skipping profile {profile}: {reason}"))
+        profiles = [profile for profile in profiles if profile not in unavailable]
+
+        results = {workload: {} for workload in workloads}
+        with benchmark.benchmark_database(users=options["users"]) as db_name:
+            for profile in profiles:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"profile {profile}"))
+                for workload in workloads:
+                    # every run starts from the same freshly seeded database
+                    try:
+                        with benchmark.database_copy(db_name) as run_db, \
+                                benchmark.gunicorn_server(run_db, profile, overrides) as transport:
+                            results[workload][profile] = benchmark.run_suite(
+                                transport,
+                                scenarios=benchmark.WORKLOADS[workload],
+                                iterations=options["iterations"],
+                                concurrency=options["concurrency"],
+                                warmup=options["warmup"],
+                                seed=options["seed"],
+                                users=options["users"],
+                            )
+                    except RuntimeError as exc:
+                        raise CommandError(f"profile {profile}: {exc}")
+                    self.summary(workload, results[workload][profile])
+
+        document = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "cpu_count": os.cpu_count(),
+                "iterations": options["iterations"],
+                "concurrency": options["concurrency"],
+                "unavailable_profiles": unavailable,
+            },
+            "workloads": {},
+        }
+        env = dict(os.environ)
+        os.environ.update(overrides)
+        try:
+            for workload, by_profile in results.items():
+                best = best_profile(by_profile)
+                document["workloads"][workload] = {
+                    "best_profile": best,
+                    "settings": build_config(best) if best else None,
+                    "results": by_profile,
+                }
+                self.stdout.write(self.style.SUCCESS(f"{workload}: best profile is {best or 'none (all had errors)'}"))
+        finally:
+            os.environ.clear()
+            os.environ.update(env)
+
+        output = write_results(document, options["output"])
+        self.stdout.write(f"results written to {output}")
+
+    def summary(self, workload, scenarios):
+        for name, s in scenarios.items():
+            self.stdout.write(
+                f"  {workload:<9}{name:<16} rps {s['rps']:>8.1f}  p50 {s['p50_ms']:>8.2f}  "
+                f"p95 {s['p95_ms']:>8.2f}  p99 {s['p99_ms']:>8.2f}  errors {s['errors']}"
+            )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.changes import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the catalog change log, keeping only the latest change of each object "
+        "(per kind and id: each product and each category). Consumers resuming from any "
+        "seq still see every changed object."
+    )
+
+    def handle(self, *args, **options):
+        deleted = compact()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} superseded catalog changes"))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop import datagen
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic catalog, users and orders at realistic scale "
+        "(skewed popularity, log-normal prices and stock) from a deterministic seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000, help="rows per bulk_create")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="worker processes for products/users/orders (not supported on SQLite)")
+        parser.add_argument("--clear", action="store_true",
+                            help="delete rows created by earlier runs before generating")
+
+    def handle(self, *args, **options):
+        if options["workers"] > 1 and connection.vendor == "sqlite":
+            raise CommandError("--workers > 1 needs a database with concurrent writers (e.g. PostgreSQL)")
+        if options["categories"] < 1:
+            raise CommandError("--categories must be at least 1")
+
+        start = time.perf_counter()
+        if options["clear"]:
+            datagen.clear_generated()
+            self.stdout.write("cleared previously generated data")
+
+        verbose = options["verbosity"] > 1
+        try:
+            datagen.generate(
+                categories=options["categories"],
+                products=options["products"],
+                users=options["users"],
+                orders=options["orders"],
+                seed=options["seed"],
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                log=self.stdout.write if verbose else None,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"generated {options['products']} products, {options['users']} users and "
+            f"{options['orders']} orders in {time.perf_counter() - start:.1f}s"
+        ))
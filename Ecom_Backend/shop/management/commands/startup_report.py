@@ -0,0 +1,111 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TARGETS = {
+    # django.setup() and command dispatch, as every manage.py invocation pays it
+    "manage": ["manage.py", "version"],
+    # what a gunicorn worker (or the master, with preload) does at boot
+    "wsgi": ["-c", "import Ecom.wsgi"],
+    "asgi": ["-c", "import Ecom.asgi"],
+}
+
+
+def parse_importtime(stderr):
+    """
+    Parse `python -X importtime` output into a list of
+    {"module", "self_us", "cumulative_us", "depth"} dicts in import order.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules.append({
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+            })
+        except ValueError:
+            continue
+    return modules
+
+
+def by_package(modules):
+    """Sum self time per top-level package (django, rest_framework, PIL, ...)."""
+    totals = defaultdict(int)
+    for m in modules:
+        totals[m["module"].split(".")[0]] += m["self_us"]
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+def measure(target, preload=False):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "Ecom.settings"))
+    env["DJANGO_PRELOAD"] = "True" if preload else "False"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-X", "importtime", *TARGETS[target]],
+        cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    stderr = proc.stderr.read()
+    _pid, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    if proc.returncode:
+        raise CommandError(f"{target} exited with status {proc.returncode}:\n{stderr[-2000:]}")
+    modules = parse_importtime(stderr)
+    return {
+        "wall_ms": round(wall * 1000, 1),
+        # ru_maxrss is KiB on Linux
+        "max_rss_kb": rusage.ru_maxrss,
+        "import_ms": round(sum(m["self_us"] for m in modules) / 1000, 1),
+        "module_count": len(modules),
+        "modules": modules,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Report process start-up cost for manage.py, Ecom.wsgi and Ecom.asgi: "
+        "wall time, peak RSS and import time per module (python -X importtime)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", action="append", choices=list(TARGETS),
+                            help="entry point to measure (repeatable); default: all")
+        parser.add_argument("--top", type=int, default=15, help="slowest modules/packages to list")
+        parser.add_argument("--repeat", type=int, default=3, help="runs per target; the fastest is reported")
+        parser.add_argument("--preload", action="store_true",
+                            help="run with DJANGO_PRELOAD=True to include Ecom.warmup")
+        parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+
+    def handle(self, *args, **options):
+        report = {}
+        for target in options["target"] or TARGETS:
+            runs = [measure(target, options["preload"]) for _ in range(max(1, options["repeat"]))]
+            report[target] = min(runs, key=lambda r: r["wall_ms"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        top = options["top"]
+        for target, r in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{target}: {r['wall_ms']} ms wall, {r['import_ms']} ms importing "
+                f"{r['module_count']} modules, peak RSS {r['max_rss_kb'] / 1024:.1f} MiB"
+            ))
+            self.stdout.write("  slowest packages (self time):")
+            for package, us in list(by_package(r["modules"]).items())[:top]:
+                self.stdout.write(f"    {us / 1000:>8.1f} ms  {package}")
+            self.stdout.write("  slowest modules (cumulative):")
+            for m in sorted(r["modules"], key=lambda m: -m["cumulative_us"])[:top]:
+                self.stdout.write(f"    {m['cumulative_us'] / 1000:>8.1f} ms  {m['module']}")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['title'], name='shop_product_title_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('category', 'Category')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['kind', 'object_id', 'seq'], name='shop_change_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:33
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_catalogchange'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='shop_product_title_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='shop_product_title_lower_idx'),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.contrib.auth import get_user_model
 
+from .cache import bump_catalog_version
+
 User = get_user_model()
 
 class Category(models.Model):
@@ -10,6 +14,15 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Bulk update; save signals do not fire, so bump the catalog version here once it commits."""
+        rows = super().update(**kwargs)
+        if rows:
+            transaction.on_commit(bump_catalog_version)
+        return rows
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, related_name="products", on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -21,9 +34,15 @@ class Product(models.Model):
     image = models.ImageField(upload_to="products/", blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+
+    objects = ProductQuerySet.as_manager()
     
     class Meta:
         ordering = ["-created"] 
+        indexes = [
+            # admin case-insensitive title-prefix search (shop.admin.PrefixSearchMixin)
+            models.Index(Lower("title"), name="shop_product_title_lower_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -36,6 +55,14 @@ class Order(models.Model):
         ("completed", "Completed"),
         ("cancelled", "Cancelled"),
     )
+    # status -> statuses it may move to; completed and cancelled are final
+    ALLOWED_TRANSITIONS = {
+        "pending": ("processing", "cancelled"),
+        "processing": ("shipped", "cancelled"),
+        "shipped": ("completed",),
+        "completed": (),
+        "cancelled": (),
+    }
     user = models.ForeignKey(User, related_name="orders", on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -46,6 +73,10 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} - {self.user}"
 
+    @classmethod
+    def statuses_leading_to(cls, status):
+        return [source for source, targets in cls.ALLOWED_TRANSITIONS.items() if status in targets]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, related_name="order_items", on_delete=models.PROTECT)
@@ -55,3 +86,118 @@ class OrderItem(models.Model):
     def line_total(self):
         return self.price_snapshot * self.quantity
 
+
+
+class CartQuerySet(models.QuerySet):
+    def abandoned(self, idle_since):
+        """Carts that still hold items but have not been touched since idle_since."""
+        return self.filter(item_count__gt=0, updated_at__lt=idle_since)
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed "frequently bought together" neighbours: the top-K products
+    co-purchased with `product`, best first (rank 0). Rebuilt by
+    `manage.py build_related_products` (shop.recommendations).
+    """
+    product = models.ForeignKey(Product, related_name="related_products", on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name="+", on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            # also the index the /products/{id}/related/ lookup uses
+            models.UniqueConstraint(fields=["product", "rank"], name="unique_related_product_rank"),
+        ]
+
+
+class CatalogChange(models.Model):
+    """
+    Append-only log of product/category changes (see shop.changes). seq only
+    ever grows; consumers remember the last seq they saw and ask for what
+    came after it.
+    """
+    PRODUCT = "product"
+    CATEGORY = "category"
+    KIND_CHOICES = ((PRODUCT, "Product"), (CATEGORY, "Category"))
+    UPSERT = "upsert"
+    DELETE = "delete"
+    ACTION_CHOICES = ((UPSERT, "Created or updated"), (DELETE, "Deleted"))
+
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["seq"]
+        indexes = [
+            # compaction looks up later changes of the same object
+            models.Index(fields=["kind", "object_id", "seq"], name="shop_change_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.action} {self.kind} {self.object_id}"
+
+
+class Cart(models.Model):
+    """
+    Server-side cart, one per user. subtotal, item_count and
+    unavailable_count are maintained incrementally by shop.carts on every
+    mutation instead of being recomputed from the lines.
+    """
+    user = models.OneToOneField(User, related_name="cart", on_delete=models.CASCADE)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    # lines whose product is inactive or has less stock than the line's quantity
+    unavailable_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = CartQuerySet.as_manager()
+
+    def __str__(self):
+        return f"Cart of {self.user}"
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="cart_items", on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    # product price cached when the line was last written or the product changed
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    available = models.BooleanField(default=True)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "product"], name="unique_cart_product"),
+        ]
+
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response stored for a client-supplied Idempotency-Key (see shop.idempotency).
+    status_code is null while the first request with the key is still running.
+    """
+    user = models.ForeignKey(User, related_name="idempotency_keys", on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # hash of method, path and body; a reused key with a different request is rejected
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_user_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user})"
@@ -0,0 +1,54 @@
+"""
+Order status transitions.
+
+transition() moves any number of orders to a new status with one
+conditional UPDATE (WHERE status IN the statuses allowed to reach it, per
+Order.ALLOWED_TRANSITIONS) and reports what happened to each order. It does
+not call save(), so no per-row post_save fires; instead one
+order_status_changed signal is sent after commit with all changed orders
+(send_robust: receiver errors are logged by django.dispatch).
+"""
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Order
+
+UPDATED = "updated"
+INVALID = "invalid_transition"
+NOT_FOUND = "not_found"
+
+# sent once per transition() call: order_ids (list), previous (dict id -> old status), status
+order_status_changed = Signal()
+
+
+def transition(order_ids, status):
+    """
+    Move order_ids to status. Returns a list of
+    {"id", "outcome", "from"} dicts in the order the ids were given.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    sources = Order.statuses_leading_to(status)
+    with transaction.atomic():
+        # lock the rows so the outcomes match what the UPDATE sees
+        previous = dict(
+            Order.objects.select_for_update().filter(pk__in=order_ids).values_list("pk", "status")
+        )
+        changed = [pk for pk in order_ids if previous.get(pk) in sources]
+        if changed:
+            Order.objects.filter(pk__in=changed, status__in=sources).update(
+                status=status, updated_at=timezone.now()
+            )
+            # the UPDATE is committed by then: a failing receiver is logged, not raised
+            transaction.on_commit(lambda: order_status_changed.send_robust(
+                sender=Order, order_ids=changed, previous={pk: previous[pk] for pk in changed}, status=status,
+            ))
+
+    changed = set(changed)
+    results = []
+    for pk in order_ids:
+        if pk not in previous:
+            results.append({"id": pk, "outcome": NOT_FOUND, "from": None})
+        else:
+            results.append({"id": pk, "outcome": UPDATED if pk in changed else INVALID, "from": previous[pk]})
+    return results
@@ -0,0 +1,161 @@
+"""
+"Frequently bought together" recommendations from OrderItem co-purchases.
+
+build() streams (order_id, product_id) pairs ordered by order, a fixed
+number of rows at a time, and accumulates a sparse product x product
+co-occurrence matrix C (C[i, j] = orders containing both i and j; C[i, i] =
+orders containing i). Scores are cosine-normalised,
+
+    score(i, j) = C[i, j] / sqrt(C[i, i] * C[j, j])
+
+so best-sellers do not dominate every list, and the top-K neighbours of
+each product are written to RelatedProduct.
+
+With NumPy and SciPy installed each block of orders becomes a sparse
+order x product matrix B and is folded in as C += B.T @ B; ranking is done
+with one lexsort. Without them the same result is computed with plain
+dicts (fine for small catalogs, much slower at scale). Either way memory is
+bounded by the block size plus the number of distinct co-purchased pairs,
+not by the number of order items.
+"""
+import heapq
+import itertools
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .cache import bump_related_version
+from .models import OrderItem, Product, RelatedProduct
+
+try:
+    import numpy as np
+    import scipy.sparse as sparse
+except ImportError:  # optional; pure-Python fallback
+    np = sparse = None
+
+DEFAULT_TOP_K = 10
+# order items fetched and folded into the matrix per block
+DEFAULT_BLOCK_SIZE = 200000
+# orders with more distinct products than this (bulk/wholesale) carry no
+# "bought together" signal and would add n^2 pairs each
+DEFAULT_MAX_BASKET = 50
+# pairs bought together fewer times than this are noise
+DEFAULT_MIN_COUNT = 2
+
+
+def order_items(chunk_size=DEFAULT_BLOCK_SIZE):
+    return (
+        OrderItem.objects.order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=min(chunk_size, 10000))
+    )
+
+
+def vectorized_neighbours(pairs, top_k, block_size, max_basket, min_count):
+    """
+    Consume pairs and return an iterator of (product_id, rank, related_id,
+    score) using NumPy/SciPy.
+    """
+    product_ids = np.fromiter(
+        Product.objects.order_by("id").values_list("id", flat=True).iterator(), dtype=np.int64
+    )
+    n = len(product_ids)
+    counts = sparse.csr_matrix((n, n), dtype=np.int64)
+    carry = np.empty((0, 2), dtype=np.int64)
+
+    def fold(block):
+        cols = np.searchsorted(product_ids, block[:, 1])
+        # products created or deleted while the build runs have no column: skip their items
+        known = cols < n
+        known[known] = product_ids[cols[known]] == block[known, 1]
+        block, cols = block[known], cols[known]
+        orders, rows = np.unique(block[:, 0], return_inverse=True)
+        baskets = sparse.csr_matrix(
+            (np.ones(len(block), dtype=np.int64), (rows, cols)), shape=(len(orders), n)
+        )
+        baskets.sum_duplicates()
+        baskets.data[:] = 1
+        baskets = baskets[np.flatnonzero(baskets.getnnz(axis=1) <= max_basket)]
+        return (baskets.T @ baskets).tocsr()
+
+    while True:
+        rows = list(itertools.islice(pairs, block_size))
+        if not rows:
+            break
+        block = np.concatenate([carry, np.array(rows, dtype=np.int64)])
+        # the last order may continue in the next block; hold it back
+        tail = block[:, 0] == block[-1, 0]
+        carry = block[tail]
+        if not tail.all():
+            counts = counts + fold(block[~tail])
+    if len(carry):
+        counts = counts + fold(carry)
+
+    occurrences = counts.diagonal().astype(np.float64)
+    pairs_coo = counts.tocoo()
+    keep = (pairs_coo.row != pairs_coo.col) & (pairs_coo.data >= min_count)
+    rows, cols, together = pairs_coo.row[keep], pairs_coo.col[keep], pairs_coo.data[keep]
+    scores = together / np.sqrt(occurrences[rows] * occurrences[cols])
+
+    # sort by product, best score first (ties: lower product id), then cut each run at top_k
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    _, starts, sizes = np.unique(rows, return_index=True, return_counts=True)
+    ranks = np.arange(len(rows)) - np.repeat(starts, sizes)
+    top = ranks < top_k
+    return zip(product_ids[rows[top]], ranks[top], product_ids[cols[top]], scores[top])
+
+
+def python_neighbours(pairs, top_k, block_size, max_basket, min_count):
+    """Same as vectorized_neighbours, with dicts."""
+    occurrences = Counter()
+    together = defaultdict(Counter)
+    for _order_id, items in itertools.groupby(pairs, key=lambda pair: pair[0]):
+        basket = {product_id for _order, product_id in items}
+        if len(basket) > max_basket:
+            continue
+        occurrences.update(basket)
+        for product_id in basket:
+            together[product_id].update(basket)
+
+    def ranked():
+        for product_id in sorted(together):
+            candidates = (
+                (count / math.sqrt(occurrences[product_id] * occurrences[other]), other)
+                for other, count in together[product_id].items()
+                if other != product_id and count >= min_count
+            )
+            best = heapq.nsmallest(top_k, candidates, key=lambda item: (-item[0], item[1]))
+            for rank, (score, other) in enumerate(best):
+                yield product_id, rank, other, score
+
+    return ranked()
+
+
+def build(top_k=DEFAULT_TOP_K, block_size=DEFAULT_BLOCK_SIZE, max_basket=DEFAULT_MAX_BASKET,
+          min_count=DEFAULT_MIN_COUNT, vectorized=None, batch_size=5000):
+    """Rebuild RelatedProduct from all order items; returns the number of rows written."""
+    if vectorized is None:
+        vectorized = np is not None
+    if vectorized and np is None:
+        raise RuntimeError("numpy and scipy are required for the vectorized build")
+    compute = vectorized_neighbours if vectorized else python_neighbours
+    # all reading and counting happens here, before the table is locked for the rewrite
+    neighbours = compute(order_items(block_size), top_k, block_size, max_basket, min_count)
+
+    written = 0
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        while True:
+            batch = [
+                RelatedProduct(product_id=int(product_id), rank=int(rank), related_id=int(related_id), score=float(score))
+                for product_id, rank, related_id, score in itertools.islice(neighbours, batch_size)
+            ]
+            if not batch:
+                break
+            RelatedProduct.objects.bulk_create(batch)
+            written += len(batch)
+    # invalidates the cached /products/{id}/related/ pages, and only those
+    transaction.on_commit(bump_related_version)
+    return written
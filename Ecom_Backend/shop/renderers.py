@@ -0,0 +1,89 @@
+"""
+Drop-in replacements for DRF's JSONRenderer/JSONParser that use orjson when
+it is installed and fall back to the stdlib-based DRF classes otherwise.
+
+The output is byte-for-byte what JSONRenderer produces for API data
+(compact separators, raw UTF-8, escaped U+2028/U+2029, DRF's formatting of
+datetimes and other non-JSON types, Decimal fields coerced to strings by
+the serializers). Cases orjson cannot match go through the stdlib path:
+indented output for the browsable API, UNICODE_JSON/COMPACT_JSON/STRICT_JSON
+turned off, and integers beyond 64 bits (which orjson would parse as
+floats). Two differences remain for floats, which no shop serializer
+emits: orjson writes exponents as 1e-5 / 1e16 (stdlib: 1e-05 / 1e+16) and
+NaN/Infinity as null instead of raising under STRICT_JSON.
+"""
+import codecs
+import io
+import re
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used instead
+    orjson = None
+
+_LONG_NUMBER = re.compile(rb"\d{19}")
+_LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+class FastJSONRenderer(JSONRenderer):
+    # datetimes go through DRF's encoder so they end in "Z" like JSONRenderer output
+    orjson_options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed("render"):
+            if orjson is None or data is None or self.ensure_ascii or not self.compact:
+                return super().render(data, accepted_media_type, renderer_context)
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            try:
+                ret = orjson.dumps(data, default=self.encoder_class().default, option=self.orjson_options)
+            except orjson.JSONEncodeError:
+                return super().render(data, accepted_media_type, renderer_context)
+            for raw, escaped in _LINE_SEPARATORS:
+                if raw in ret:
+                    ret = ret.replace(raw, escaped)
+            return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        body = stream.read()
+        if _LONG_NUMBER.search(body):
+            # orjson turns integers beyond 64 bits into floats; json keeps them exact
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body if codecs.lookup(encoding).name == "utf-8" else body.decode(encoding))
+        except UnicodeDecodeError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+        except orjson.JSONDecodeError:
+            # re-parse with the stdlib for DRF's usual error message
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets views accept `Accept: text/event-stream` (or ?format=event-stream)
+    during content negotiation; the view itself returns the streaming
+    response. Anything else rendered with it (e.g. an error) is sent as JSON.
+    """
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if renderer_context and "response" in renderer_context:
+            renderer_context["response"]["Content-Type"] = "application/json"
+        return FastJSONRenderer().render(data)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Category, Product, Order, OrderItem
+from .models import Category, Product, Order, OrderItem, Cart, CartItem
+from .instrumentation import TimedSerializerMixin
+from .categories import registry as category_registry
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 User = get_user_model()
@@ -44,15 +46,71 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name", "slug"]
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
-    category_id = serializers.PrimaryKeyRelatedField(
+class CategoryIdField(serializers.PrimaryKeyRelatedField):
+    """Category primary key resolved from shop.categories.registry instead of a query."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        category = category_registry.get(pk)
+        if category is None:
+            self.fail("does_not_exist", pk_value=data)
+        return category
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for sparse fieldsets: pass fields=[...] to keep only
+    those fields. model_columns() gives the columns they read, for only().
+    """
+    # serializer field -> model columns it reads, where that is not just its source
+    field_columns = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def readable_fields(cls):
+        return cls._sparse_fields()[0]
+
+    @classmethod
+    def model_columns(cls, fields):
+        field_columns = cls._sparse_fields()[1]
+        columns = {"pk"}
+        for name in fields:
+            columns.update(field_columns[name])
+        return sorted(columns)
+
+    @classmethod
+    def _sparse_fields(cls):
+        """(readable field names, field -> model columns), built once per class."""
+        # looked up in cls.__dict__ so subclasses do not reuse their parent's
+        cached = cls.__dict__.get("_sparse_fields_cache")
+        if cached is None:
+            declared = cls().fields
+            readable = [name for name, field in declared.items() if not field.write_only]
+            columns = {name: cls.field_columns.get(name, [field.source]) for name, field in declared.items()}
+            cached = cls._sparse_fields_cache = (readable, columns)
+        return cached
+
+
+class ProductSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    # read from the category registry, so product querysets need no join on category
+    category = serializers.SerializerMethodField(read_only=True)
+    category_id = CategoryIdField(
         write_only=True, queryset=Category.objects.all(), source="category"
     )
     image_url = serializers.SerializerMethodField(read_only=True)
@@ -75,6 +133,12 @@ class ProductSerializer(serializers.ModelSerializer):
             "category_id",
         ]
 
+    field_columns = {"category": ["category_id"], "image_url": ["image"]}
+
+    def get_category(self, obj):
+        category = category_registry.get(obj.category_id) or obj.category
+        return {"id": category.pk, "name": category.name, "slug": category.slug}
+
     def get_image_url(self, obj):
         # Return absolute URL when request is in context, else return relative url or None
         request = self.context.get("request")
@@ -89,7 +153,7 @@ class ProductSerializer(serializers.ModelSerializer):
         return request.build_absolute_uri(url)
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # read-only nested product info for responses
     product = ProductSerializer(read_only=True)
     # write-only numeric id; source="product" will convert id -> Product instance on validation
@@ -102,7 +166,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "product_id", "quantity", "price_snapshot"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     user = serializers.StringRelatedField()
 
@@ -200,3 +264,38 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         order.save()
         return order
 
+
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class CartItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product_id = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(source="product.title", read_only=True)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CartItem
+        fields = ["product_id", "title", "quantity", "unit_price", "line_total", "available", "added_at"]
+
+
+class CartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    items = CartItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = ["id", "subtotal", "item_count", "unavailable_count", "updated_at", "items"]
+
+
+class CartItemWriteSerializer(serializers.Serializer):
+    product_id = serializers.PrimaryKeyRelatedField(queryset=Product.objects.filter(is_active=True), source="product")
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartQuantitySerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartCheckoutSerializer(serializers.Serializer):
+    shipping_address = serializers.CharField(max_length=500, required=False, allow_blank=True, default="")
@@ -1,12 +1,21 @@
+import logging
+
 from django.conf import settings
+from django.db import transaction
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.core.mail import send_mail
+from django.core.mail import send_mail, send_mass_mail
 from decimal import Decimal
-from .models import Order
+from .models import Cart, CatalogChange, Category, Order, Product
+from .cache import bump_catalog_version
+from .categories import invalidate_categories
+from . import carts, changes
+from .autocomplete import index as autocomplete_index
+from .orders import order_status_changed
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=User)
 def send_welcome_email(sender, instance, created, **kwargs):
@@ -45,3 +54,89 @@ def send_order_confirmation(sender, instance, created, **kwargs):
             [instance.user.email],
             fail_silently=False,
         )
+
+
+@receiver(order_status_changed)
+def send_status_update_emails(sender, order_ids, status, **kwargs):
+    # one query and one mail connection for the whole batch
+    recipients = Order.objects.filter(pk__in=order_ids).exclude(user__email="").values_list(
+        "pk", "user__username", "user__email"
+    )
+    messages = [
+        (
+            f"Order #{pk} is now {status}",
+            f"Hi {username},\n\nYour order #{pk} is now {status}.",
+            settings.DEFAULT_FROM_EMAIL,
+            [email],
+        )
+        for pk, username, email in recipients
+    ]
+    if not messages:
+        return
+    try:
+        send_mass_mail(messages, fail_silently=False)
+    except Exception:
+        # runs after the status UPDATE committed; a mail failure must not fail the request
+        logger.exception("could not send status emails for orders %s", list(order_ids))
+
+
+# Version bumps wait for the commit: bumped earlier, another worker could reload
+# (or re-cache) the old rows under the new stamp and keep them until the next change.
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    # cached catalog pages are keyed by the catalog version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_registry(sender, **kwargs):
+    # reloads the category registry in every worker (and bumps the catalog version)
+    transaction.on_commit(invalidate_categories)
+
+
+@receiver(post_save, sender=Product)
+def refresh_cart_lines(sender, instance, created, **kwargs):
+    # keep cached cart prices / availability in step with the product
+    if not created:
+        carts.refresh_product(instance)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts_holding_product(sender, instance, **kwargs):
+    instance._cart_ids = carts.carts_holding(instance)
+
+
+@receiver(post_delete, sender=Product)
+def recompute_carts_after_product_delete(sender, instance, **kwargs):
+    cart_ids = getattr(instance, "_cart_ids", None)
+    if cart_ids:
+        carts.recompute_totals(Cart.objects.filter(pk__in=cart_ids))
+
+
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, **kwargs):
+    # other workers apply the same change from the catalog change feed
+    transaction.on_commit(lambda: autocomplete_index.update(instance))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.discard(pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def log_catalog_change(sender, instance, **kwargs):
+    kind = CatalogChange.PRODUCT if sender is Product else CatalogChange.CATEGORY
+    changes.record(kind, instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def log_catalog_delete(sender, instance, **kwargs):
+    kind = CatalogChange.PRODUCT if sender is Product else CatalogChange.CATEGORY
+    changes.record(kind, instance.pk, CatalogChange.DELETE)
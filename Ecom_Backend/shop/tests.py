@@ -3,14 +3,40 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core import mail
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from .models import Product, Category, Order, OrderItem
+from io import StringIO
+from unittest import mock, skipIf
+import gzip
+import itertools
+import json
+import os
+from .models import Product, Category, Order, OrderItem, Cart, CartItem, IdempotencyKey, RelatedProduct, CatalogChange
+from . import benchmark, carts, changes, datagen, recommendations
+from .categories import registry as category_registry
+from .autocomplete import index as autocomplete_index
 
 User = get_user_model()
 
 
-class EcomAPITestCase(APITestCase):
+class ShopAPITestCase(APITestCase):
+    """
+    Catalog version bumps run on commit, and test data is never committed, so
+    every test starts from an empty cache and unloaded in-process catalog state.
+    """
+
+    def setUp(self):
+        cache.clear()
+        category_registry.invalidate()
+        autocomplete_index.invalidate()
+
+
+class EcomAPITestCase(ShopAPITestCase):
     """
     Full-stack tests for common flows:
       - register -> welcome email
@@ -23,6 +49,7 @@ class EcomAPITestCase(APITestCase):
     """
 
     def setUp(self):
+        super().setUp()
         # Use the api/v1 prefix that's configured in your project urls
         API_PREFIX = "/api/v1"
 
@@ -199,3 +226,1163 @@ class EcomAPITestCase(APITestCase):
         payload = {"items": [{"product_id": p.id, "quantity": 1}], "shipping_address": "nowhere"}
         resp = self.client.post(self.orders_url, payload, format="json")
         self.assertIn(resp.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+
+class PerformanceInstrumentationTestCase(ShopAPITestCase):
+    """
+    PerformanceMiddleware: Server-Timing header, sampling and N+1 detection.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.products_url = "/api/v1/products/"
+        self.orders_url = "/api/v1/orders/"
+        self.cat = Category.objects.create(name="Garden", slug="garden")
+        self.p1 = Product.objects.create(title="Rake", price=Decimal("8.00"), stock=5, category=self.cat)
+        self.p2 = Product.objects.create(title="Hose", price=Decimal("12.00"), stock=5, category=self.cat)
+
+    @override_settings(SHOP_PERF={"SAMPLE_RATE": 1.0, "SERVER_TIMING": True})
+    def test_server_timing_header(self):
+        resp = self.client.get(self.products_url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        timing = resp["Server-Timing"]
+        for metric in ("db;", "serializer;", "auth;", "total;"):
+            self.assertIn(metric, timing)
+
+    @override_settings(SHOP_PERF={"SAMPLE_RATE": 1.0, "SERVER_TIMING": "staff"}, SHOP_COMPRESSION={"CACHE_TIMEOUT": 0})
+    def test_server_timing_staff_only(self):
+        self.assertFalse(self.client.get(self.products_url).has_header("Server-Timing"))
+        staff = User.objects.create_user(username="ops", password="opspass", is_staff=True)
+        self.client.force_authenticate(user=staff)
+        self.assertTrue(self.client.get(self.products_url).has_header("Server-Timing"))
+
+    @override_settings(SHOP_PERF={"SAMPLE_RATE": 0})
+    def test_unsampled_request_has_no_header(self):
+        resp = self.client.get(self.products_url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(resp.has_header("Server-Timing"))
+
+    @override_settings(SHOP_PERF={"SAMPLE_RATE": 1.0, "DUPLICATE_QUERY_THRESHOLD": 2})
+    def test_repeated_queries_are_reported_with_view(self):
+        user = User.objects.create_user(username="dave", password="davepass")
+        self.client.force_authenticate(user=user)
+        payload = {"items": [{"product_id": self.p1.id, "quantity": 1}, {"product_id": self.p2.id, "quantity": 1}]}
+        with self.assertLogs("shop.perf.queries", level="WARNING") as logs:
+            resp = self.client.post(self.orders_url, payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(any("possible N+1 in OrderViewSet.create" in line for line in logs.output))
+
+
+class BenchmarkSuiteTestCase(ShopAPITestCase):
+    """
+    Smoke-test the load-test scenarios through the in-process transport.
+    """
+
+    @override_settings(SHOP_PERF={"SAMPLE_RATE": 1.0, "SERVER_TIMING": True})
+    def test_all_scenarios_run_without_errors(self):
+        benchmark.seed_benchmark_data(users=2)
+        results = benchmark.run_suite(benchmark.ClientTransport(), iterations=2, warmup=0, users=2)
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        for name, stats in results.items():
+            self.assertEqual(stats["requests"], 2, name)
+            self.assertEqual(stats["errors"], 0, name)
+            self.assertGreater(stats["p99_ms"], 0, name)
+            self.assertIsNotNone(stats["queries_per_request"], name)
+
+    def test_compare_flags_latency_regressions(self):
+        baseline = {"scenarios": {"browse": {"p95_ms": 10.0, "rps": 100.0}}}
+        current = {"scenarios": {"browse": {"p95_ms": 15.0, "rps": 98.0}}}
+        rows = {(name, metric): regressed for name, metric, _o, _n, _c, regressed in benchmark.compare(current, baseline)}
+        self.assertTrue(rows[("browse", "p95_ms")])
+        self.assertFalse(rows[("browse", "rps")])
+
+
+class GenerateDataTestCase(ShopAPITestCase):
+    """
+    generate_data: row counts, consistent order totals and seed determinism.
+    """
+
+    def generate(self, seed=7):
+        call_command("generate_data", categories=3, products=40, users=10, orders=25, seed=seed,
+                     batch_size=8, stdout=StringIO())
+
+    def test_generates_requested_rows_with_consistent_totals(self):
+        self.generate()
+        self.assertEqual(Category.objects.filter(slug__startswith=datagen.CATEGORY_PREFIX).count(), 3)
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(User.objects.filter(username__startswith=datagen.USERNAME_PREFIX).count(), 10)
+        self.assertEqual(Order.objects.count(), 25)
+        for order in Order.objects.prefetch_related("items"):
+            self.assertGreaterEqual(len(order.items.all()), 1)
+            self.assertEqual(order.total_price, sum(item.line_total() for item in order.items.all()))
+        # bulk_create does not fire the order confirmation signal
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = list(Product.objects.order_by("id").values_list("title", "price", "stock"))
+        datagen.clear_generated()
+        self.assertEqual(Product.objects.count(), 0)
+        self.generate()
+        self.assertEqual(list(Product.objects.order_by("id").values_list("title", "price", "stock")), first)
+
+
+class StartupReportTestCase(ShopAPITestCase):
+    """
+    startup_report: parsing of `python -X importtime` output.
+    """
+
+    def test_parse_importtime(self):
+        from .management.commands.startup_report import by_package, parse_importtime
+
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     django.utils.version\n"
+            "import time:       300 |        420 |   django\n"
+            "import time:        80 |         80 | shop.signals\n"
+        )
+        modules = parse_importtime(stderr)
+        self.assertEqual([m["module"] for m in modules], ["django.utils.version", "django", "shop.signals"])
+        self.assertEqual(modules[1]["cumulative_us"], 420)
+        self.assertEqual(modules[1]["depth"], 1)
+        self.assertEqual(by_package(modules), {"django": 420, "shop": 80})
+
+
+class ServerProfileTestCase(ShopAPITestCase):
+    """
+    Ecom/server.py profiles and the benchmark_server profile selection.
+    """
+
+    def test_build_config_applies_env_overrides(self):
+        from Ecom.server import build_config
+
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "3", "GUNICORN_THREADS": "8", "GUNICORN_PRELOAD": "False"}):
+            config = build_config("catalog")
+        self.assertEqual(config["workers"], 3)
+        self.assertEqual(config["worker_class"], "gthread")
+        self.assertEqual(config["threads"], 8)
+        self.assertFalse(config["preload_app"])
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "3", "GUNICORN_THREADS": "8"}):
+            # threads only apply to gthread workers
+            self.assertEqual(build_config("checkout")["threads"], 1)
+        with self.assertRaises(ValueError):
+            build_config("nope")
+
+    def test_best_profile_skips_runs_with_errors(self):
+        from .management.commands.benchmark_server import best_profile
+
+        fast_but_failing = {"browse": {"p95_ms": 5.0, "rps": 500.0, "errors": 3}}
+        slower = {"browse": {"p95_ms": 20.0, "rps": 100.0, "errors": 0}}
+        slowest = {"browse": {"p95_ms": 40.0, "rps": 50.0, "errors": 0}}
+        self.assertEqual(best_profile({"a": fast_but_failing, "b": slower, "c": slowest}), "b")
+        self.assertIsNone(best_profile({"a": fast_but_failing}))
+
+    def test_async_profile_without_uvicorn_is_unavailable(self):
+        from Ecom.server import unavailable_reason
+
+        with mock.patch("Ecom.server.uvicorn_worker_class", return_value=None):
+            self.assertIn("uvicorn", unavailable_reason("async"))
+        self.assertIsNone(unavailable_reason("catalog"))
+
+    def test_database_copy_isolates_runs(self):
+        import sqlite3
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(suffix=".sqlite3") as source:
+            with sqlite3.connect(source.name) as db:
+                db.execute("CREATE TABLE t (n INTEGER)")
+            with benchmark.database_copy(source.name) as run_db:
+                with sqlite3.connect(run_db) as db:
+                    db.execute("INSERT INTO t VALUES (1)")
+            with sqlite3.connect(source.name) as db:
+                self.assertEqual(db.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+            self.assertFalse(os.path.exists(run_db))
+
+
+class CompressionTestCase(ShopAPITestCase):
+    """
+    CompressionMiddleware: negotiation, size threshold and precompressed catalog pages.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.products_url = "/api/v1/products/"
+        self.cat = Category.objects.create(name="Kitchen", slug="kitchen")
+        for i in range(6):
+            Product.objects.create(title=f"Pan {i}", description="Non-stick pan " * 20, price=Decimal("20.00"), category=self.cat)
+
+    def test_negotiate(self):
+        from .compression import negotiate
+
+        self.assertEqual(negotiate("gzip, deflate"), "gzip")
+        self.assertIsNone(negotiate("gzip;q=0, identity"))
+        self.assertIsNone(negotiate(""))
+
+    def test_gzip_response_and_cache_hit(self):
+        resp = self.client.get(self.products_url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertEqual(resp["X-Catalog-Cache"], "miss")
+        data = json.loads(gzip.decompress(resp.content))
+        self.assertEqual(data["count"], 6)
+
+        again = self.client.get(self.products_url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(again["X-Catalog-Cache"], "hit")
+        self.assertEqual(again.content, resp.content)
+        self.assertEqual(again["Content-Encoding"], "gzip")
+
+        # identity clients get their own, uncompressed cache entry
+        plain = self.client.get(self.products_url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain.json()["count"], 6)
+
+    def test_product_change_invalidates_cached_pages(self):
+        self.client.get(self.products_url, HTTP_ACCEPT_ENCODING="gzip")
+        # the version is bumped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(title="Pot", price=Decimal("30.00"), category=self.cat)
+        resp = self.client.get(self.products_url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["X-Catalog-Cache"], "miss")
+        self.assertEqual(json.loads(gzip.decompress(resp.content))["count"], 7)
+
+    def test_credentials_bypass_the_page_cache(self):
+        self.client.get(self.products_url)
+        self.assertEqual(self.client.get(self.products_url)["X-Catalog-Cache"], "hit")
+        # a cached page must not answer for a token authentication would reject
+        resp = self.client.get(self.products_url, HTTP_AUTHORIZATION="Bearer not-a-token")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn("X-Catalog-Cache", resp)
+
+    def test_queryset_update_invalidates_cached_pages(self):
+        self.client.get(self.products_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(title="Pan 0").update(price=Decimal("5.00"))
+        resp = self.client.get(self.products_url)
+        self.assertEqual(resp["X-Catalog-Cache"], "miss")
+        self.assertIn("5.00", [p["price"] for p in resp.json()["results"]])
+
+    def test_generate_data_invalidates_cached_pages(self):
+        self.client.get(self.products_url)
+        call_command("generate_data", categories=1, products=3, users=1, orders=1, seed=1, stdout=StringIO())
+        resp = self.client.get(self.products_url)
+        self.assertEqual(resp["X-Catalog-Cache"], "miss")
+        self.assertEqual(resp.json()["count"], 9)
+
+    def test_deploy_check_warns_about_process_local_cache(self):
+        from .checks import check_shared_cache
+
+        self.assertEqual([w.id for w in check_shared_cache(None)], ["shop.W001"])
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cache"}}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_small_responses_are_not_compressed(self):
+        resp = self.client.get("/api/v1/auth/me/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(resp.has_header("Content-Encoding"))
+
+
+class FastJSONTestCase(ShopAPITestCase):
+    """
+    shop.renderers must produce exactly what DRF's stdlib JSON classes produce.
+    """
+
+    def test_render_matches_drf_json_renderer(self):
+        import datetime
+        import uuid
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = {
+            "price": "199.99",
+            "raw_decimal": Decimal("4.50"),
+            "created": datetime.datetime(2025, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+            "day": datetime.date(2025, 1, 2),
+            "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "title": "Caf\u00e9 \u2028 line \u2029 para \"quoted\" </script>",
+            1: [True, None, 3, 2.5],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # indented output (e.g. browsable API) falls back to the stdlib path
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+    def test_api_responses_match_drf_json_renderer(self):
+        from rest_framework.renderers import JSONRenderer
+
+        cat = Category.objects.create(name="Music", slug="music")
+        Product.objects.create(title="Guitar \u266b", description="Six strings", price=Decimal("250.00"), rating=4.5, category=cat)
+        resp = self.client.get("/api/v1/products/")
+        self.assertEqual(resp.content, JSONRenderer().render(resp.data))
+
+    def test_parser(self):
+        import io
+        from rest_framework.exceptions import ParseError
+        from .renderers import FastJSONParser
+
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"items": [{"product_id": 1, "quantity": 2}]}')),
+                         {"items": [{"product_id": 1, "quantity": 2}]})
+        # larger than 64 bits: handled by the stdlib fallback
+        self.assertEqual(parser.parse(io.BytesIO(b'{"n": 123456789012345678901234567890}')),
+                         {"n": 123456789012345678901234567890})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"broken": '))
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"n": NaN}'))
+
+
+class CartTestCase(ShopAPITestCase):
+    """
+    Server-side cart: incremental totals, price/stock refresh, checkout and abandoned carts.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cart_url = "/api/v1/cart/"
+        self.user = User.objects.create_user(username="shopper", email="shopper@example.com", password="pw123456")
+        self.client.force_authenticate(self.user)
+        cat = Category.objects.create(name="Garden", slug="garden")
+        self.hose = Product.objects.create(title="Hose", price=Decimal("12.50"), stock=10, category=cat)
+        self.rake = Product.objects.create(title="Rake", price=Decimal("20.00"), stock=2, category=cat)
+
+    def test_totals_follow_line_changes(self):
+        resp = self.client.post(f"{self.cart_url}items/", {"product_id": self.hose.id, "quantity": 2}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.client.post(f"{self.cart_url}items/", {"product_id": self.rake.id}, format="json")
+        self.client.post(f"{self.cart_url}items/", {"product_id": self.hose.id}, format="json")
+
+        data = self.client.get(self.cart_url).json()
+        self.assertEqual(Decimal(data["subtotal"]), Decimal("57.50"))
+        self.assertEqual(data["item_count"], 4)
+        self.assertEqual(len(data["items"]), 2)
+
+        resp = self.client.patch(f"{self.cart_url}items/{self.rake.id}/", {"quantity": 5}, format="json")
+        self.assertEqual(resp.json()["unavailable_count"], 1)
+        resp = self.client.delete(f"{self.cart_url}items/{self.hose.id}/")
+        self.assertEqual(Decimal(resp.json()["subtotal"]), Decimal("100.00"))
+        self.assertEqual(resp.json()["item_count"], 5)
+
+        resp = self.client.delete(f"{self.cart_url}items/{self.hose.id}/")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_add_merges_with_a_line_created_concurrently(self):
+        cart = carts.get_cart(self.user)
+        carts.add_item(cart, self.hose, 2)
+        # the locked lookup misses, as if another request inserted the line in between
+        with mock.patch.object(CartItem.objects, "select_for_update", return_value=CartItem.objects.none()):
+            carts.add_item(cart, self.hose, 3)
+        cart.refresh_from_db()
+        self.assertEqual(cart.items.get().quantity, 5)
+        self.assertEqual((cart.item_count, cart.subtotal), (5, Decimal("62.50")))
+
+    def test_product_changes_refresh_cached_lines(self):
+        cart = carts.get_cart(self.user)
+        carts.add_item(cart, self.hose, 3)
+        carts.add_item(cart, self.rake, 1)
+
+        self.hose.price = Decimal("10.00")
+        self.hose.save()
+        self.rake.is_active = False
+        self.rake.save()
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, Decimal("50.00"))
+        self.assertEqual(cart.unavailable_count, 1)
+
+        self.rake.delete()
+        cart.refresh_from_db()
+        self.assertEqual(cart.subtotal, Decimal("30.00"))
+        self.assertEqual((cart.item_count, cart.unavailable_count), (3, 0))
+
+    def test_checkout_creates_order_and_empties_cart(self):
+        cart = carts.get_cart(self.user)
+        for product in (self.hose, self.rake):
+            carts.add_item(cart, product, 2)
+
+        resp = self.client.post(f"{self.cart_url}checkout/", {"shipping_address": "1 Main St"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        order = Order.objects.get(pk=resp.json()["id"])
+        self.assertEqual(order.total_price, Decimal("65.00"))
+        self.assertEqual(order.items.count(), 2)
+        self.assertTrue(any(order.user.email in m.to for m in mail.outbox))
+
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (0, Decimal("0")))
+        resp = self.client.post(f"{self.cart_url}checkout/", {}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checkout_query_count_does_not_grow_with_cart(self):
+        cat = self.hose.category
+        products = [Product.objects.create(title=f"Seed {i}", price=Decimal("1.00"), stock=5, category=cat) for i in range(10)]
+        small = carts.get_cart(self.user)
+        carts.add_item(small, products[0])
+        with CaptureQueriesContext(connection) as small_ctx:
+            carts.checkout(small)
+
+        for product in products:
+            carts.add_item(small, product)
+        with self.assertNumQueries(len(small_ctx.captured_queries)):
+            carts.checkout(small)
+
+    def test_checkout_rejects_insufficient_stock(self):
+        cart = carts.get_cart(self.user)
+        carts.add_item(cart, self.rake, 3)
+        resp = self.client.post(f"{self.cart_url}checkout/", {}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Not enough stock", str(resp.json()))
+        self.assertFalse(Order.objects.exists())
+
+    def test_abandoned_carts(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        cart = carts.get_cart(self.user)
+        carts.add_item(cart, self.hose)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=3))
+        other = User.objects.create_user(username="empty", password="pw123456")
+        carts.get_cart(other)
+
+        idle_since = timezone.now() - timedelta(days=1)
+        self.assertEqual(list(Cart.objects.abandoned(idle_since)), [cart])
+
+
+class IdempotencyKeyTestCase(ShopAPITestCase):
+    """
+    Idempotency-Key on POST /orders/: replay, conflicts, expiry and purge.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.orders_url = "/api/v1/orders/"
+        self.user = User.objects.create_user(username="retry", email="retry@example.com", password="pw123456")
+        self.client.force_authenticate(self.user)
+        cat = Category.objects.create(name="Tools", slug="tools")
+        self.product = Product.objects.create(title="Saw", price=Decimal("9.00"), stock=10, category=cat)
+        self.payload = {"items": [{"product_id": self.product.id, "quantity": 1}], "shipping_address": "1 Main St"}
+
+    def place(self, key, payload=None):
+        return self.client.post(self.orders_url, payload or self.payload, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        mail.outbox = []
+        first = self.place("abc-1")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):  # only the key lookup
+            second = self.place("abc-1")
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # a new key places a new order
+        self.assertEqual(self.place("abc-2").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_with_different_body(self):
+        self.place("abc-1")
+        other = dict(self.payload, shipping_address="2 Side St")
+        self.assertEqual(self.place("abc-1", other).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_client_errors_are_stored(self):
+        invalid = {"items": [{"product_id": self.product.id, "quantity": 0}], "shipping_address": "1 Main St"}
+        first = self.place("abc-1", invalid)
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        second = self.place("abc-1", invalid)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+
+    def test_order_is_rolled_back_when_response_cannot_be_stored(self):
+        save = IdempotencyKey.save
+
+        def fail_storing_response(record, *args, **kwargs):
+            if kwargs.get("update_fields"):
+                self.assertEqual(Order.objects.count(), 1)
+                raise RuntimeError("worker died")
+            return save(record, *args, **kwargs)
+
+        with mock.patch.object(IdempotencyKey, "save", fail_storing_response):
+            with self.assertRaises(RuntimeError):
+                self.place("abc-1")
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.place("abc-1").status_code, status.HTTP_201_CREATED)
+
+    def test_key_in_progress_conflicts(self):
+        self.place("abc-1")
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+        self.assertEqual(self.place("abc-1").status_code, status.HTTP_409_CONFLICT)
+
+    def test_abandoned_claim_is_taken_over_after_lock_timeout(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        self.place("abc-1")
+        # the worker handling the first attempt was killed before storing a response
+        Order.objects.all().delete()
+        IdempotencyKey.objects.update(
+            status_code=None, response_body=None, created_at=timezone.now() - timedelta(seconds=91)
+        )
+        resp = self.place("abc-1")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(resp.has_header("Idempotent-Replayed"))
+        self.assertEqual(self.place("abc-1")["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.place("abc-1")
+        other = User.objects.create_user(username="other", password="pw123456")
+        self.client.force_authenticate(other)
+        resp = self.place("abc-1")
+        self.assertFalse(resp.has_header("Idempotent-Replayed"))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_expired_keys_run_again_and_are_purged(self):
+        from django.utils import timezone
+
+        self.place("abc-1")
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        resp = self.place("abc-1")
+        self.assertFalse(resp.has_header("Idempotent-Replayed"))
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Deleted 1", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_requests_without_key_are_unchanged(self):
+        self.client.post(self.orders_url, self.payload, format="json")
+        self.client.post(self.orders_url, self.payload, format="json")
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class AdminChangeListTestCase(ShopAPITestCase):
+    """
+    Admin changelists: query counts must not grow with the number of rows.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username="boss", email="", password="boss12345")
+        self.client.force_login(self.admin)
+        self.cat = Category.objects.create(name="Office", slug="office")
+
+    def add_rows(self, n):
+        for _ in range(n):
+            user = User.objects.create_user(username=f"buyer{User.objects.count()}", password="pw123456")
+            product = Product.objects.create(title=f"Pen {Product.objects.count()}", price=Decimal("1.00"), stock=5, category=self.cat)
+            order = Order.objects.create(user=user, total_price=Decimal("1.00"))
+            OrderItem.objects.create(order=order, product=product, quantity=1, price_snapshot=Decimal("1.00"))
+            carts.add_item(carts.get_cart(user), product)
+
+    def assert_constant_queries(self, url):
+        self.add_rows(2)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(5)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return small.captured_queries
+
+    def test_product_changelist(self):
+        self.assert_constant_queries("/admin/shop/product/")
+
+    def test_order_changelist(self):
+        self.assert_constant_queries("/admin/shop/order/")
+
+    def test_cart_changelist(self):
+        self.assert_constant_queries("/admin/shop/cart/")
+
+    def test_filtered_changelist_counts_once(self):
+        queries = self.assert_constant_queries("/admin/shop/order/?status__exact=pending")
+        counts = [q["sql"] for q in queries if "COUNT(" in q["sql"] and "shop_order" in q["sql"]]
+        self.assertEqual(len(counts), 1)
+
+    def test_order_change_page_inline(self):
+        self.add_rows(1)
+        order = Order.objects.first()
+        url = f"/admin/shop/order/{order.pk}/change/"
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as one_item:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for i in range(4):
+            product = Product.objects.create(title=f"Ink {i}", price=Decimal("2.00"), category=self.cat)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price_snapshot=Decimal("2.00"))
+        with self.assertNumQueries(len(one_item.captured_queries)):
+            self.client.get(url)
+
+    def test_prefix_search(self):
+        Product.objects.create(title="Stapler", price=Decimal("5.00"), category=self.cat)
+        Product.objects.create(title="Paper stack", price=Decimal("5.00"), category=self.cat)
+        resp = self.client.get("/admin/shop/product/", {"q": "stap"})
+        self.assertContains(resp, "Stapler")
+        self.assertNotContains(resp, "Paper stack")
+
+        product = Product.objects.get(title="Paper stack")
+        resp = self.client.get("/admin/shop/product/", {"q": str(product.pk)})
+        self.assertContains(resp, "Paper stack")
+
+        # too long for a 64-bit id: searched as a title prefix only
+        resp = self.client.get("/admin/shop/product/", {"q": "9" * 30})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, "Paper stack")
+
+    def test_prefix_search_ignores_case(self):
+        Product.objects.create(title="USB Cable", price=Decimal("5.00"), category=self.cat)
+        Product.objects.create(title="Äpfel", price=Decimal("5.00"), category=self.cat)
+        self.assertContains(self.client.get("/admin/shop/product/", {"q": "usb"}), "USB Cable")
+        self.assertContains(self.client.get("/admin/shop/product/", {"q": "uSb c"}), "USB Cable")
+        self.assertContains(self.client.get("/admin/shop/product/", {"q": "äpf"}), "Äpfel")
+
+    def test_prefix_search_uses_title_index(self):
+        from .admin import ProductAdmin
+        from django.contrib import admin as django_admin
+
+        model_admin = ProductAdmin(Product, django_admin.site)
+        queryset, _ = model_admin.get_search_results(None, Product.objects.all(), "stap")
+        with connection.cursor() as cursor:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("shop_product_title_lower_idx", plan)
+
+    def test_prefix_search_at_highest_code_point(self):
+        Product.objects.create(title="Odd \U0010ffff title", price=Decimal("5.00"), category=self.cat)
+        resp = self.client.get("/admin/shop/product/", {"q": "odd \U0010ffff"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "Odd \U0010ffff title")
+
+
+class OrderStatusTransitionTestCase(ShopAPITestCase):
+    """
+    update_status / bulk_update_status: transition graph, one UPDATE, batch notifications.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.orders_url = "/api/v1/orders/"
+        self.admin = User.objects.create_superuser(username="warehouse", email="", password="wh123456")
+        self.client.force_authenticate(self.admin)
+        self.buyer = User.objects.create_user(username="buyer", email="buyer@example.com", password="pw123456")
+        self.orders = [Order.objects.create(user=self.buyer, status="processing") for _ in range(3)]
+
+    def test_bulk_update_applies_valid_transitions(self):
+        done = Order.objects.create(user=self.buyer, status="completed")
+        ids = [o.pk for o in self.orders] + [done.pk, 9999]
+        mail.outbox = []
+        # notifications are sent on commit
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(f"{self.orders_url}bulk_update_status/", {"ids": ids, "status": "shipped"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.json()
+        self.assertEqual(data["updated"], 3)
+        outcomes = {r["id"]: r["outcome"] for r in data["results"]}
+        self.assertEqual(outcomes[done.pk], "invalid_transition")
+        self.assertEqual(outcomes[9999], "not_found")
+        self.assertEqual(Order.objects.filter(status="shipped").count(), 3)
+        done.refresh_from_db()
+        self.assertEqual(done.status, "completed")
+
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "shop_order"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn("shipped", mail.outbox[0].subject)
+
+    def test_mail_failure_does_not_fail_committed_update(self):
+        ids = [o.pk for o in self.orders]
+        with mock.patch("shop.signals.send_mass_mail", side_effect=OSError("smtp down")), \
+                self.assertLogs("shop.signals", level="ERROR"), self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(f"{self.orders_url}bulk_update_status/", {"ids": ids, "status": "shipped"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()["updated"], 3)
+        self.assertEqual(Order.objects.filter(status="shipped").count(), 3)
+
+    def test_bulk_update_is_admin_only(self):
+        self.client.force_authenticate(self.buyer)
+        resp = self.client.post(f"{self.orders_url}bulk_update_status/", {"ids": [self.orders[0].pk], "status": "shipped"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_single_update_rejects_disallowed_transition(self):
+        order = self.orders[0]
+        url = f"{self.orders_url}{order.pk}/update_status/"
+        self.assertEqual(self.client.post(url, {"status": "pending"}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {"status": "shipped"}, format="json").status_code, status.HTTP_200_OK)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "shipped")
+
+
+class CategoryRegistryTestCase(ShopAPITestCase):
+    """
+    shop.categories.registry: category lookups without queries, cross-worker invalidation.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from .categories import registry
+
+        self.registry = registry
+        self.cat = Category.objects.create(name="Music", slug="music")
+        self.other = Category.objects.create(name="Film", slug="film")
+        Product.objects.create(title="Vinyl", price=Decimal("25.00"), stock=3, category=self.cat)
+        Product.objects.create(title="DVD", price=Decimal("9.00"), stock=3, category=self.other)
+        self.registry.all()
+
+    def category_queries(self, queries):
+        return [q["sql"] for q in queries if "shop_category" in q["sql"]]
+
+    def test_reads_do_not_query_categories(self):
+        with CaptureQueriesContext(connection) as ctx:
+            products = self.client.get("/api/v1/products/").json()
+            categories = self.client.get("/api/v1/categories/").json()
+            single = self.client.get(f"/api/v1/categories/{self.cat.pk}/").json()
+        self.assertEqual(self.category_queries(ctx.captured_queries), [])
+        self.assertEqual({p["category"]["slug"] for p in products["results"]}, {"music", "film"})
+        self.assertEqual([c["slug"] for c in categories["results"]], ["music", "film"])
+        self.assertEqual(single["name"], "Music")
+
+    def test_list_honours_ordering(self):
+        resp = self.client.get("/api/v1/categories/", {"ordering": "name"})
+        self.assertEqual([c["slug"] for c in resp.json()["results"]], ["film", "music"])
+        resp = self.client.get("/api/v1/categories/", {"ordering": "-id"})
+        self.assertEqual([c["slug"] for c in resp.json()["results"]], ["film", "music"])
+        # unknown fields are ignored, as OrderingFilter does
+        resp = self.client.get("/api/v1/categories/", {"ordering": "secret"})
+        self.assertEqual([c["slug"] for c in resp.json()["results"]], ["music", "film"])
+
+    def test_version_is_bumped_after_commit(self):
+        from .cache import category_version
+
+        before = category_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Category.objects.create(name="Games", slug="games")
+            self.assertEqual(category_version(), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(category_version(), before)
+
+    def test_product_write_resolves_category_from_registry(self):
+        admin = User.objects.create_superuser(username="cat_admin", email="", password="pw123456")
+        self.client.force_authenticate(admin)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post("/api/v1/products/", {"title": "Tape", "price": "4.00", "category_id": self.other.pk}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertFalse([q for q in self.category_queries(ctx.captured_queries) if q.startswith("SELECT")])
+        self.assertEqual(Product.objects.get(title="Tape").category, self.other)
+
+        resp = self.client.post("/api/v1/products/", {"title": "Tape", "price": "4.00", "category_id": 9999}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_by_slug(self):
+        resp = self.client.get("/api/v1/products/", {"category": "film"})
+        self.assertEqual([p["title"] for p in resp.json()["results"]], ["DVD"])
+        resp = self.client.get("/api/v1/products/", {"category": "nope"})
+        self.assertEqual(resp.json()["count"], 0)
+
+    def test_version_stamp_invalidates_other_workers(self):
+        from .cache import bump_category_version
+
+        # another worker renames a category: only the shared stamp changes here
+        Category.objects.filter(pk=self.cat.pk).update(name="Records")
+        bump_category_version()
+        self.assertEqual(self.registry.get(self.cat.pk).name, "Music")
+        with mock.patch("shop.categories.CHECK_INTERVAL", 0):
+            self.assertEqual(self.registry.get(self.cat.pk).name, "Records")
+
+        # unknown ids force a check, so new categories show up at once
+        Category.objects.bulk_create([Category(name="Games", slug="games")])
+        bump_category_version()
+        self.assertEqual(self.registry.get_by_slug("games").name, "Games")
+
+    def test_cached_pages_are_not_rendered_from_a_stale_registry(self):
+        from .cache import bump_category_version
+        from .categories import CategoryRegistry
+
+        # this worker's registry checked its stamp a moment ago
+        worker = CategoryRegistry()
+        worker.all()
+        with mock.patch("shop.views.category_registry", worker), \
+                mock.patch("shop.serializers.category_registry", worker), \
+                mock.patch("shop.compression.category_registry", worker):
+            # another worker renames a category and bumps the shared stamps
+            Category.objects.filter(pk=self.cat.pk).update(name="Records")
+            bump_category_version()
+            categories = self.client.get("/api/v1/categories/")
+            products = self.client.get("/api/v1/products/", {"category": "music"})
+        self.assertEqual(categories["X-Catalog-Cache"], "miss")
+        self.assertEqual([c["name"] for c in categories.json()["results"]], ["Records", "Film"])
+        self.assertEqual(products.json()["results"][0]["category"]["name"], "Records")
+
+    def test_worker_without_shared_cache_stays_correct(self):
+        # another worker's changes, whose stamp bumps never reach this process (LocMemCache)
+        [games] = Category.objects.bulk_create([Category(name="Games", slug="games")])
+        # an unknown id or slug is looked up in the database before giving up
+        self.assertEqual(self.registry.get(games.pk).name, "Games")
+        self.assertIsNone(self.registry.get_by_slug("nope"))
+        # and no copy is served for longer than MAX_AGE
+        Category.objects.filter(pk=self.cat.pk).update(name="Records")
+        self.assertEqual(self.registry.get(self.cat.pk).name, "Music")
+        with mock.patch("shop.categories.CHECK_INTERVAL", 0), mock.patch("shop.categories.MAX_AGE", 0):
+            self.assertEqual(self.registry.get(self.cat.pk).name, "Records")
+
+
+class RelatedProductsTestCase(ShopAPITestCase):
+    """
+    Co-purchase recommendations: batch build (vectorized and pure Python) and /related/.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cat = Category.objects.create(name="Kitchen", slug="kitchen")
+        self.p = {name: Product.objects.create(title=name, price=Decimal("5.00"), stock=100, category=cat)
+                  for name in ("pan", "lid", "spatula", "kettle", "mug")}
+        buyer = User.objects.create_user(username="cook", password="pw123456")
+        baskets = [
+            ("pan", "lid"), ("pan", "lid", "spatula"), ("pan", "lid"), ("pan", "spatula"),
+            ("kettle", "mug"), ("kettle", "mug"), ("mug",), ("pan", "spatula", "mug"),
+        ]
+        for basket in baskets:
+            order = Order.objects.create(user=buyer)
+            for name in basket:
+                OrderItem.objects.create(order=order, product=self.p[name], quantity=1, price_snapshot=Decimal("5.00"))
+
+    def related_titles(self, name):
+        return list(RelatedProduct.objects.filter(product=self.p[name]).values_list("related__title", flat=True))
+
+    def test_python_build(self):
+        written = recommendations.build(top_k=2, vectorized=False)
+        self.assertEqual(written, RelatedProduct.objects.count())
+        self.assertEqual(self.related_titles("pan"), ["lid", "spatula"])
+        self.assertEqual(self.related_titles("kettle"), ["mug"])
+        # lid and spatula were bought together only once (below min_count)
+        self.assertEqual(self.related_titles("lid"), ["pan"])
+
+    @skipIf(recommendations.np is None, "numpy/scipy not installed")
+    def test_vectorized_build_matches_python(self):
+        expected = recommendations.build(top_k=3, vectorized=False, min_count=1)
+        rows = list(RelatedProduct.objects.values_list("product_id", "rank", "related_id", "score"))
+        # tiny blocks exercise orders that straddle block boundaries
+        self.assertEqual(recommendations.build(top_k=3, vectorized=True, min_count=1, block_size=3), expected)
+        vectorized = list(RelatedProduct.objects.values_list("product_id", "rank", "related_id", "score"))
+        self.assertEqual([r[:3] for r in vectorized], [r[:3] for r in rows])
+        for a, b in zip(vectorized, rows):
+            self.assertAlmostEqual(a[3], b[3])
+
+    @skipIf(recommendations.np is None, "numpy/scipy not installed")
+    def test_vectorized_build_skips_products_created_during_the_build(self):
+        expected = list(recommendations.vectorized_neighbours(recommendations.order_items(), 3, 3, 50, 1))
+        newest = max(p.pk for p in self.p.values())
+        # a product created after the id snapshot, already in a streamed order
+        pairs = itertools.chain(recommendations.order_items(), [(10 ** 6, newest + 1), (10 ** 6, self.p["pan"].pk)])
+        self.assertEqual(
+            [row[:3] for row in recommendations.vectorized_neighbours(pairs, 3, 3, 50, 1)],
+            [row[:3] for row in expected],
+        )
+
+    def test_max_basket_skips_bulk_orders(self):
+        recommendations.build(vectorized=False, max_basket=2)
+        self.assertEqual(self.related_titles("pan"), ["lid"])
+
+    def test_related_endpoint_is_one_query(self):
+        recommendations.build(vectorized=False)
+        self.p["lid"].is_active = False
+        self.p["lid"].save()
+        url = f"/api/v1/products/{self.p['pan'].pk}/related/"
+        category_registry.all()  # loaded once per worker
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_ACCEPT_ENCODING="identity")
+        self.assertEqual([p["title"] for p in resp.json()], ["spatula"])
+        self.assertEqual(self.client.get("/api/v1/products/abc/related/").status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_related_of_unknown_or_inactive_product_is_404(self):
+        recommendations.build(vectorized=False)
+        self.assertEqual(self.client.get(f"/api/v1/products/{10 ** 6}/related/").status_code, status.HTTP_404_NOT_FOUND)
+        Product.objects.filter(pk=self.p["pan"].pk).update(is_active=False)
+        resp = self.client.get(f"/api/v1/products/{self.p['pan'].pk}/related/")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        # an active product without neighbours is an empty list
+        RelatedProduct.objects.filter(product=self.p["kettle"]).delete()
+        resp = self.client.get(f"/api/v1/products/{self.p['kettle'].pk}/related/")
+        self.assertEqual((resp.status_code, resp.json()), (status.HTTP_200_OK, []))
+
+    def test_rebuild_only_invalidates_related_pages(self):
+        related_url = f"/api/v1/products/{self.p['pan'].pk}/related/"
+        self.client.get("/api/v1/products/")
+        self.client.get(related_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            recommendations.build(vectorized=False)
+        self.assertEqual(self.client.get("/api/v1/products/")["X-Catalog-Cache"], "hit")
+        resp = self.client.get(related_url)
+        self.assertEqual(resp["X-Catalog-Cache"], "miss")
+        self.assertEqual([p["title"] for p in resp.json()], ["lid", "spatula"])
+
+
+class AutocompleteTestCase(ShopAPITestCase):
+    """
+    /products/autocomplete/: in-memory prefix index and its incremental updates.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = "/api/v1/products/autocomplete/"
+        cat = Category.objects.create(name="Kitchen", slug="kitchen")
+        self.pan = Product.objects.create(title="Non-stick Pan", price=Decimal("20.00"), category=cat)
+        self.pot = Product.objects.create(title="Pasta Pot", price=Decimal("30.50"), category=cat)
+        Product.objects.create(title="Panini Press", price=Decimal("45.00"), category=cat, is_active=False)
+        autocomplete_index.invalidate()
+
+    def titles(self, q):
+        return [r["title"] for r in autocomplete_index.search(q)]
+
+    def test_prefix_matches_any_word(self):
+        self.assertEqual(self.titles("pa"), ["Non-stick Pan", "Pasta Pot"])
+        self.assertEqual(self.titles("PASTA p"), ["Pasta Pot"])
+        self.assertEqual(self.titles("pot"), ["Pasta Pot"])
+        self.assertEqual(self.titles("x"), [])
+        self.assertEqual(self.titles("  "), [])
+
+    def test_endpoint_needs_no_queries(self):
+        autocomplete_index.search("")
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url, {"q": "pas", "limit": 5}, HTTP_ACCEPT_ENCODING="identity")
+        self.assertEqual(resp.json(), [{"id": self.pot.pk, "title": "Pasta Pot", "price": "30.50"}])
+
+    def test_signals_update_index_incrementally(self):
+        autocomplete_index.search("")
+        with self.assertNumQueries(0):
+            self.pan.title = "Frying Pan"
+            self.pan.price = Decimal("22.00")
+            autocomplete_index.update(self.pan)
+        self.assertEqual(self.titles("fry"), ["Frying Pan"])
+        self.assertEqual(self.titles("non"), [])
+
+        # saves and deletes are applied once they commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pot.is_active = False
+            self.pot.save()
+        self.assertEqual(self.titles("pasta"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pan.delete()
+        self.assertEqual(self.titles("pan"), [])
+        self.assertEqual(len(autocomplete_index), 0)
+
+    def test_responses_are_not_page_cached(self):
+        for _ in range(2):
+            resp = self.client.get(self.url, {"q": "pas"})
+            self.assertFalse(resp.has_header("X-Catalog-Cache"))
+
+    def test_other_workers_changes_are_applied_from_the_feed(self):
+        autocomplete_index.search("")
+        # another worker's save: the row and its change feed entry, nothing in this process
+        Product.objects.filter(pk=self.pot.pk).update(title="Stock Pot", price=Decimal("31.00"))
+        changes.record(CatalogChange.PRODUCT, self.pot.pk)
+        Product.objects.filter(pk=self.pan.pk).update(is_active=False)
+        changes.record(CatalogChange.PRODUCT, self.pan.pk)
+        with mock.patch("shop.autocomplete.CHECK_INTERVAL", 0), \
+                mock.patch.object(autocomplete_index, "build", side_effect=AssertionError("full rebuild")), \
+                self.assertNumQueries(2):
+            self.assertEqual(autocomplete_index.search("stock"), [{"id": self.pot.pk, "title": "Stock Pot", "price": "31.00"}])
+        self.assertEqual(self.titles("pan"), [])
+
+    def test_bulk_changes_rebuild_off_the_request_path(self):
+        autocomplete_index.search("")
+        changes.record_bulk(CatalogChange.PRODUCT, [self.pan.pk, self.pot.pk])
+        with mock.patch("shop.autocomplete.CHECK_INTERVAL", 0), mock.patch("shop.autocomplete.REBUILD_THRESHOLD", 1), \
+                mock.patch.object(autocomplete_index, "rebuild_in_background") as rebuild:
+            self.assertEqual(self.titles("pasta"), ["Pasta Pot"])
+        rebuild.assert_called_once()
+
+
+class SparseFieldsTestCase(ShopAPITestCase):
+    """
+    ProductViewSet ?ids= batch retrieval and ?fields= sparse fieldsets.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = "/api/v1/products/"
+        cat = Category.objects.create(name="Shoes", slug="shoes")
+        self.products = [
+            Product.objects.create(title=f"Shoe {i}", description="Long text " * 50, price=Decimal(f"{10 + i}.00"), category=cat)
+            for i in range(4)
+        ]
+        self.products[3].is_active = False
+        self.products[3].save()
+        category_registry.all()
+
+    def get(self, params):
+        return self.client.get(self.url, params, HTTP_ACCEPT_ENCODING="identity")
+
+    def test_batch_ids_in_requested_order(self):
+        a, b, c, inactive = self.products
+        with self.assertNumQueries(1):
+            resp = self.get({"ids": f"{c.pk},{a.pk},{inactive.pk},9999,{a.pk}"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([p["id"] for p in resp.json()], [c.pk, a.pk])
+
+        self.assertEqual(self.get({"ids": "1,x"}).status_code, status.HTTP_400_BAD_REQUEST)
+        too_many = ",".join(str(i) for i in range(1, 102))
+        self.assertEqual(self.get({"ids": too_many}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fields_trim_output_and_sql(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.get({"ids": ",".join(str(p.pk) for p in self.products), "fields": "id,title,price,image_url"})
+        self.assertEqual(set(resp.json()[0]), {"id", "title", "price", "image_url"})
+        sql = ctx.captured_queries[-1]["sql"]
+        self.assertNotIn('"description"', sql)
+        self.assertIn('"image"', sql)
+
+        full = self.get({"page_size": 3}).json()["results"]
+        trimmed = self.get({"page_size": 3, "fields": "id,title,category"}).json()["results"]
+        self.assertEqual([{k: p[k] for k in ("id", "title", "category")} for p in full], trimmed)
+
+    def test_fields_on_retrieve_and_unknown_fields(self):
+        resp = self.client.get(f"{self.url}{self.products[0].pk}/", {"fields": "title"})
+        self.assertEqual(resp.json(), {"title": "Shoe 0"})
+        resp = self.get({"fields": "id,description,secret"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("secret", str(resp.json()))
+        self.assertEqual(self.get({"fields": "category_id"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fields_on_related_trim_sql(self):
+        a, b, c, _inactive = self.products
+        RelatedProduct.objects.create(product=a, related=b, rank=0, score=1.0)
+        RelatedProduct.objects.create(product=a, related=c, rank=1, score=0.5)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(f"{self.url}{a.pk}/related/", {"fields": "id,title"}, HTTP_ACCEPT_ENCODING="identity")
+        self.assertEqual(resp.json(), [{"id": b.pk, "title": "Shoe 1"}, {"id": c.pk, "title": "Shoe 2"}])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"description"', ctx.captured_queries[0]["sql"])
+
+    def test_field_metadata_is_built_once_per_class(self):
+        from .serializers import ProductSerializer
+
+        ProductSerializer.readable_fields()
+        with mock.patch.object(ProductSerializer, "get_fields", side_effect=AssertionError("rebuilt")):
+            self.assertIn("title", ProductSerializer.readable_fields())
+            self.assertEqual(ProductSerializer.model_columns(["image_url", "category"]), ["category_id", "image", "pk"])
+
+
+class CatalogChangeFeedTestCase(ShopAPITestCase):
+    """
+    /changes/: change log from signals and bulk paths, ?after= paging, long-poll, SSE, compaction.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.url = "/api/v1/changes/"
+        self.cat = Category.objects.create(name="Toys", slug="toys")
+        self.ball = Product.objects.create(title="Ball", price=Decimal("3.00"), category=self.cat)
+        self.kite = Product.objects.create(title="Kite", price=Decimal("8.00"), category=self.cat)
+        self.ball.price = Decimal("3.50")
+        self.ball.save()
+        self.kite_id = self.kite.pk
+        self.kite.delete()
+
+    def feed(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_signals_append_changes_in_order(self):
+        data = self.feed()
+        self.assertEqual(
+            [(c["kind"], c["action"]) for c in data["results"]],
+            [("category", "upsert"), ("product", "upsert"), ("product", "upsert"), ("product", "upsert"), ("product", "delete")],
+        )
+        seqs = [c["seq"] for c in data["results"]]
+        self.assertEqual(seqs, sorted(seqs))
+        self.assertEqual(data["last_seq"], seqs[-1])
+        self.assertFalse(data["has_more"])
+
+    def test_paging_after_seq(self):
+        first = self.feed(limit=2)
+        self.assertTrue(first["has_more"])
+        rest = self.feed(after=first["last_seq"])
+        self.assertEqual(len(first["results"]) + len(rest["results"]), 5)
+        self.assertEqual(self.feed(after=rest["last_seq"])["results"], [])
+        self.assertEqual(self.client.get(self.url, {"after": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SHOP_CHANGES={"POLL_INTERVAL": 0.01})
+    def test_long_poll_polls_the_cache_not_the_table(self):
+        last = self.feed()["last_seq"]
+        with self.assertNumQueries(2):  # before waiting and once at the deadline
+            data = self.feed(after=last, wait=0.1)
+        self.assertEqual((data["results"], data["last_seq"]), ([], last))
+
+        # a write during the wait ends it early
+        def add_product(seconds):
+            # waiters are woken when the write commits
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.create(title="Yo-yo", price=Decimal("2.00"), category=self.cat)
+
+        with mock.patch("shop.changes.time.sleep", side_effect=add_product):
+            data = self.feed(after=last, wait=10)
+        self.assertEqual([c["action"] for c in data["results"]], ["upsert"])
+
+    @override_settings(SHOP_CHANGES={"STREAM_DURATION": 0})
+    def test_server_sent_events_resume_from_last_event_id(self):
+        seqs = [c["seq"] for c in self.feed()["results"]]
+        resp = self.client.get(self.url, HTTP_ACCEPT="text/event-stream", HTTP_LAST_EVENT_ID=str(seqs[2]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp["Content-Type"].startswith("text/event-stream"))
+        body = b"".join(resp.streaming_content).decode()
+        events = [e for e in body.split("\n\n") if e.startswith("id:")]
+        self.assertEqual([int(e.split("\n")[0][4:]) for e in events], seqs[3:])
+        self.assertIn('"action": "delete"', events[-1])
+
+    @override_settings(SHOP_CHANGES={"GAP_TIMEOUT": 5})
+    def test_out_of_order_commit_is_not_skipped(self):
+        from django.utils import timezone
+        from datetime import timedelta
+
+        last = changes.last_seq()
+        # another transaction took the next seq but has not committed yet
+        open_change = changes.record(CatalogChange.PRODUCT, self.ball.pk)
+        CatalogChange.objects.filter(pk=open_change.pk).delete()
+        pan = Product.objects.create(title="Pan", price=Decimal("9.00"), category=self.cat)
+        self.assertEqual(self.feed(after=last)["results"], [])
+        self.assertEqual(changes.last_seq(), last)
+        # it commits: both changes are served, in seq order
+        CatalogChange.objects.create(seq=open_change.pk, kind=CatalogChange.PRODUCT, object_id=self.ball.pk, action="upsert")
+        data = self.feed(after=last)
+        self.assertEqual([c["id"] for c in data["results"]], [self.ball.pk, pan.pk])
+        self.assertEqual(changes.last_seq(), data["last_seq"])
+
+        # a gap that outlives GAP_TIMEOUT was a rollback and is skipped
+        rolled_back = changes.record(CatalogChange.PRODUCT, self.ball.pk)
+        CatalogChange.objects.filter(pk=rolled_back.pk).delete()
+        Product.objects.create(title="Pot", price=Decimal("9.00"), category=self.cat)
+        position = data["last_seq"]
+        self.assertEqual(self.feed(after=position)["results"], [])
+        CatalogChange.objects.filter(seq__gt=position).update(created_at=timezone.now() - timedelta(seconds=10))
+        self.assertEqual([c["seq"] for c in self.feed(after=position)["results"]], [rolled_back.pk + 1])
+        self.assertEqual(changes.last_seq(), rolled_back.pk + 1)
+
+    @override_settings(SHOP_CHANGES={"STREAMING": False})
+    def test_no_held_requests_on_sync_workers(self):
+        resp = self.client.get(self.url, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(resp.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        last = self.feed()["last_seq"]
+        with mock.patch("shop.changes.time.sleep") as sleep:
+            self.assertEqual(self.feed(after=last, wait=10)["results"], [])
+        sleep.assert_not_called()
+
+    def test_bulk_paths_are_logged(self):
+        before = changes.last_seq()
+        datagen.generate(categories=2, products=5, users=0, orders=0, seed=1)
+        kinds = list(CatalogChange.objects.filter(seq__gt=before).values_list("kind", flat=True))
+        self.assertEqual((kinds.count("category"), kinds.count("product")), (2, 5))
+
+    def test_compaction_keeps_latest_change_per_object(self):
+        position = self.feed(limit=1)["last_seq"]
+        out = StringIO()
+        call_command("compact_catalog_changes", stdout=out)
+        self.assertIn("Removed 2", out.getvalue())
+        data = self.feed(after=position)
+        self.assertEqual(
+            {(c["kind"], c["id"], c["action"]) for c in data["results"]},
+            {("product", self.ball.pk, "upsert"), ("product", self.kite_id, "delete")},
+        )
@@ -1,19 +1,38 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.settings import api_settings
+import json
+import time
+from operator import attrgetter
 
-from .models import Product, Category, Order
+from .models import Product, Category, Order, Cart, RelatedProduct
+from .instrumentation import InstrumentedViewMixin
+from .idempotency import IdempotentCreateMixin
+from .categories import registry as category_registry
+from .autocomplete import index as autocomplete_index
+from .filters import ProductFilter
+from . import carts, changes, orders
+from .renderers import EventStreamRenderer
 from .serializers import (
     ProductSerializer,
     CategorySerializer,
     OrderSerializer,
     OrderCreateSerializer,
     UserRegistrationSerializer,
+    CartSerializer,
+    CartItemWriteSerializer,
+    CartQuantitySerializer,
+    CartCheckoutSerializer,
+    BulkStatusUpdateSerializer,
 )
 
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -22,10 +41,10 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class MyTokenView(TokenObtainPairView):
+class MyTokenView(InstrumentedViewMixin, TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
     
-class CurrentUserAPIView(APIView):
+class CurrentUserAPIView(InstrumentedViewMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -43,7 +62,7 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class RegisterAPIView(APIView):
+class RegisterAPIView(InstrumentedViewMixin, APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
@@ -57,38 +76,143 @@ class RegisterAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     """
     Public product listing. Supports:
       - search (SearchFilter): ?search=term
       - ordering (OrderingFilter): ?ordering=price or ?ordering=-price
       - django-filter lookups on price and category e.g. ?price__gte=10&price__lte=100&category__id=3
+      - ?category=<id or slug>
+      - batch retrieval: ?ids=1,2,3 (unpaginated, in the given order)
+      - sparse fieldsets: ?fields=id,title,price,image_url (also on retrieve and related)
+    Categories in the output come from shop.categories.registry, not a join.
     """
-    queryset = Product.objects.filter(is_active=True).select_related("category")
+    queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
 
-    # Allow lookup expressions for price (gte/lte/gt/lt) and exact match for category id
-    filterset_fields = {
-        "price": ["exact", "gte", "lte", "gt", "lt"],
-        "category__id": ["exact"],
-        "stock": ["exact", "gte", "lte"],
-    }
+    # price (gte/lte/gt/lt), category id or slug, stock; see shop.filters.ProductFilter
+    filterset_class = ProductFilter
 
     search_fields = ["title", "subtitle", "description"]
     ordering_fields = ["price", "created", "rating", "title"]
 
+    # most products a single ?ids= request may ask for
+    max_batch_ids = 100
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    def requested_fields(self):
+        """Field names from ?fields=a,b,c on GET requests, or None for all fields."""
+        # asked for by both get_queryset() and get_serializer(); parsed once per request
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = self._parse_requested_fields()
+        return self._requested_fields
+
+    def _parse_requested_fields(self):
+        if self.request is None or self.request.method != "GET" or "fields" not in self.request.query_params:
+            return None
+        fields = [f.strip() for f in self.request.query_params["fields"].split(",") if f.strip()]
+        readable = ProductSerializer.readable_fields()
+        unknown = [f for f in fields if f not in readable]
+        if unknown or not fields:
+            raise ValidationError({"fields": f"Unknown field(s) {', '.join(unknown) or '(none)'}; choose from {', '.join(readable)}."})
+        return fields
+
+    def requested_ids(self):
+        raw = self.request.query_params.get("ids")
+        if raw is None:
+            return None
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in raw.split(",") if pk.strip()))
+        except ValueError:
+            raise ValidationError({"ids": "Expected a comma-separated list of product ids."})
+        if not ids or len(ids) > self.max_batch_ids:
+            raise ValidationError({"ids": f"Give between 1 and {self.max_batch_ids} ids."})
+        return ids
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.requested_fields()
+        if fields is not None:
+            # fetch only the columns the trimmed serializer reads (no description etc.)
+            queryset = queryset.only(*ProductSerializer.model_columns(fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs["fields"] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # ?ids=1,2,3: those products (active ones only), unpaginated, in the order asked for
+        ids = self.requested_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        products = {p.pk: p for p in self.filter_queryset(self.get_queryset()).filter(pk__in=ids)}
+        found = [products[pk] for pk in ids if pk in products]
+        return Response(self.get_serializer(found, many=True).data)
+
+    # search-box suggestions from the in-memory title index: ?q=<prefix>&limit=10
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        return Response(autocomplete_index.search(request.query_params.get("q", ""), limit))
+
+    # "frequently bought together", precomputed by `manage.py build_related_products`;
+    # one indexed query on (product, rank), joined to the related products
+    @action(detail=True, methods=["get"])
+    def related(self, request, pk=None):
+        if not str(pk).isdigit():
+            raise Http404
+        rows = (
+            RelatedProduct.objects.filter(product_id=pk, product__is_active=True, related__is_active=True)
+            .select_related("related")
+            .order_by("rank")
+        )
+        fields = self.requested_fields()
+        if fields is not None:
+            columns = [Product._meta.pk.name if c == "pk" else c for c in ProductSerializer.model_columns(fields)]
+            rows = rows.only(*(f"related__{column}" for column in columns))
+        products = [row.related for row in rows]
+        if not products:
+            # no neighbours, or no such (active) product: only the latter is a 404
+            get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(self.get_serializer(products, many=True).data)
+
+
+class CategoryViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
+    # list and retrieve are served from the in-process category registry; writes go to the DB
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        categories = category_registry.all()
+        # ?ordering= as OrderingFilter validates it for the queryset, applied to the registry's list
+        ordering = filters.OrderingFilter().get_ordering(request, self.get_queryset(), self)
+        for field in reversed(ordering or ()):
+            categories = sorted(categories, key=attrgetter(field.lstrip("-")), reverse=field.startswith("-"))
+        page = self.paginate_queryset(categories)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class OrderViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field, "")
+        category = category_registry.get(int(pk)) if str(pk).isdigit() else None
+        if category is None:
+            raise Http404
+        self.check_object_permissions(request, category)
+        return Response(self.get_serializer(category).data)
+
+
+class OrderViewSet(InstrumentedViewMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
+    # POST with an Idempotency-Key header is safe to retry (see shop.idempotency)
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.OrderingFilter, DjangoFilterBackend]
@@ -116,7 +240,153 @@ class OrderViewSet(viewsets.ModelViewSet):
         valid_choices = dict(Order.STATUS_CHOICES)
         if status_val not in valid_choices:
             return Response({"detail": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = status_val
-        order.save(update_fields=["status"])
+        [result] = orders.transition([order.pk], status_val)
+        if result["outcome"] != orders.UPDATED:
+            return Response(
+                {"detail": f"Cannot change status from {result['from']} to {status_val}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         return Response({"detail": "Status updated"}, status=status.HTTP_200_OK)
 
+    # admin-only bulk transition (POST payload {"ids": [1, 2, 3], "status": "shipped"});
+    # valid transitions are applied with one UPDATE, invalid ones are reported per order
+    @action(detail=False, methods=["post"], permission_classes=[IsAdminUser])
+    def bulk_update_status(self, request):
+        serializer = BulkStatusUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = orders.transition(serializer.validated_data["ids"], serializer.validated_data["status"])
+        return Response({
+            "status": serializer.validated_data["status"],
+            "updated": sum(1 for r in results if r["outcome"] == orders.UPDATED),
+            "results": results,
+        })
+
+
+class CartViewSet(InstrumentedViewMixin, viewsets.ViewSet):
+    """
+    The current user's server-side cart:
+      GET    /cart/                       cart with lines and running totals
+      POST   /cart/items/                 {"product_id": 1, "quantity": 2} adds to the line
+      PATCH  /cart/items/{product_id}/    {"quantity": 3} sets the line quantity
+      DELETE /cart/items/{product_id}/    removes the line
+      POST   /cart/clear/
+      POST   /cart/checkout/              {"shipping_address": "..."} creates an order
+    """
+    permission_classes = [IsAuthenticated]
+
+    def cart_response(self, cart, status_code=status.HTTP_200_OK):
+        cart = Cart.objects.prefetch_related("items__product").get(pk=cart.pk)
+        return Response(CartSerializer(cart).data, status=status_code)
+
+    def list(self, request):
+        return self.cart_response(carts.get_cart(request.user))
+
+    @action(detail=False, methods=["post"])
+    def items(self, request):
+        serializer = CartItemWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = carts.get_cart(request.user)
+        carts.add_item(cart, serializer.validated_data["product"], serializer.validated_data["quantity"])
+        return self.cart_response(cart, status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["patch", "delete"], url_path=r"items/(?P<product_id>\d+)")
+    def item(self, request, product_id=None):
+        cart = carts.get_cart(request.user)
+        product = get_object_or_404(Product, pk=product_id)
+        try:
+            if request.method == "DELETE":
+                carts.remove_item(cart, product)
+            else:
+                serializer = CartQuantitySerializer(data=request.data)
+                serializer.is_valid(raise_exception=True)
+                carts.set_quantity(cart, product, serializer.validated_data["quantity"])
+        except carts.CartError as exc:
+            return Response(exc.detail, status=status.HTTP_404_NOT_FOUND)
+        return self.cart_response(cart)
+
+    @action(detail=False, methods=["post"])
+    def clear(self, request):
+        cart = carts.get_cart(request.user)
+        carts.clear(cart)
+        return self.cart_response(cart)
+
+    @action(detail=False, methods=["post"])
+    def checkout(self, request):
+        serializer = CartCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = carts.checkout(carts.get_cart(request.user), serializer.validated_data["shipping_address"])
+        except carts.CartError as exc:
+            return Response(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+        order = Order.objects.prefetch_related("items__product").get(pk=order.pk)
+        return Response(OrderSerializer(order, context={"request": request}).data, status=status.HTTP_201_CREATED)
+
+
+class CatalogChangesView(InstrumentedViewMixin, APIView):
+    """
+    Catalog change feed (see shop.changes):
+      GET /changes/?after=<seq>&limit=100          next page of changes after seq
+      GET /changes/?after=<seq>&wait=20            long-poll: hold the request until
+                                                   something changes or wait seconds pass
+      GET /changes/ with Accept: text/event-stream Server-Sent Events; resumes from
+                                                   Last-Event-ID (or ?after=) on reconnect
+    Each change is {"seq", "kind", "id", "action", "at"}; keep the last seq
+    seen and pass it as ?after= next time.
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [EventStreamRenderer]
+
+    def get(self, request):
+        conf = changes.changes_settings()
+        try:
+            after = max(int(request.query_params.get("after") or request.headers.get("Last-Event-ID") or 0), 0)
+            limit = min(max(int(request.query_params.get("limit", conf["PAGE_SIZE"])), 1), conf["MAX_PAGE_SIZE"])
+            wait = min(max(float(request.query_params.get("wait", 0)), 0), conf["MAX_WAIT"])
+            if not conf["STREAMING"]:
+                wait = 0
+        except ValueError:
+            return Response({"detail": "after and limit must be integers, wait a number of seconds."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if request.accepted_renderer.format == EventStreamRenderer.format:
+            if not conf["STREAMING"]:
+                return Response({"detail": "Event streams are not available on this server; poll with ?after=."},
+                                status=status.HTTP_406_NOT_ACCEPTABLE)
+            response = StreamingHttpResponse(self.events(after, limit, conf), content_type="text/event-stream")
+            response["Cache-Control"] = "no-cache"
+            # stop nginx from buffering the stream
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        rows, has_more = changes.wait_for_changes(after, limit, wait, conf)
+        return Response({
+            "results": [self.change(row) for row in rows],
+            "last_seq": rows[-1]["seq"] if rows else after,
+            "has_more": has_more,
+        })
+
+    @staticmethod
+    def change(row):
+        return {"seq": row["seq"], "kind": row["kind"], "id": row["object_id"],
+                "action": row["action"], "at": row["created_at"]}
+
+    def events(self, after, limit, conf):
+        started = last_sent = time.monotonic()
+        while True:
+            rows, has_more = changes.changes_after(after, limit, conf=conf)
+            for row in rows:
+                data = json.dumps(self.change(row), cls=DjangoJSONEncoder)
+                yield f"id: {row['seq']}\nevent: change\ndata: {data}\n\n"
+                after = row["seq"]
+            if has_more:
+                continue
+            if rows:
+                last_sent = time.monotonic()
+            remaining = started + conf["STREAM_DURATION"] - time.monotonic()
+            if remaining <= 0:
+                return
+            if time.monotonic() - last_sent >= conf["HEARTBEAT"]:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            # block (polling the cache stamp) until the next change or heartbeat
+            changes.wait_for_changes(after, 1, min(conf["HEARTBEAT"], remaining), conf)